@@ -0,0 +1,5 @@
+-- Running perf_summary statistics for the strategy engines (perf_accumulator.py).
+-- Kept out of perf_summary so the frontend never downloads it.
+
+alter table public.strategy_metrics
+  add column if not exists perf_state jsonb null;
@@ -1,12 +1,24 @@
 import datetime as dt
-import math
-import random
-import time
 from collections import defaultdict
 
-import requests
+import numpy as np
 from supabase import Client, create_client
 
+from analytics import DECIMAL, calendar_rows, parse_daily_returns
+from bar_store import BarStore
+from market_data import AlpacaMarketDataClient
+from perf_accumulator import PerfAccumulator
+from series_codec import decode_series, encode_for_storage
+from series_windows import (
+    ALPACA_WINDOW_DAYS,
+    WINDOW_INDEX_ENABLED,
+    decode_window_columns,
+    slice_windows,
+    window_columns,
+)
+from supabase_reader import iter_rows
+from supabase_writer import BulkUpsertWriter, FieldFingerprints
+
 # ===========================
 # CONFIG
 # ===========================
@@ -20,77 +32,79 @@ APCA_API_SECRET_KEY = "AfVJWotnuyuSE2LBqFhX744zia9qc65xPSwbGEvCEC1T"
 
 ALPACA_DATA_BASE = "https://data.alpaca.markets"
 
+# strategy_metrics payloads are flushed as bulk upserts of this size
+WRITE_BATCH_SIZE = 50
+
+# Sent with every strategy_metrics upsert so its insert half satisfies the
+# table's NOT NULL constraints (besides strategy_id, the admin page only
+# sets portfolio_holdings and asset_allocation when it creates a row).
+STRATEGY_REQUIRED_COLUMNS = ("portfolio_holdings",)
+
+# Send only the strategy_metrics columns whose content differs from the row
+# as read (see FieldFingerprints in supabase_writer.py); strategies whose
+# metrics did not change are not written at all.
+PARTIAL_WRITES = True
+
+# Use the NumPy return kernels (identical output to the dict-based loops)
+VECTORIZED_RETURNS = True
+
+# Serve daily closes from the local bar store written by the universe
+# updater when it covers every held symbol; otherwise fall back to Alpaca.
+USE_BAR_STORE = False
+
+# Resume perf_summary statistics from strategy_metrics.perf_state and fold in
+# only the new days instead of recomputing over the full history.
+INCREMENTAL_PERF_SUMMARY = True
+
+bar_store = BarStore()
+metrics_fingerprints = FieldFingerprints(touch_columns=("updated_at",))
+
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+market_data = AlpacaMarketDataClient(
+    APCA_API_KEY_ID, APCA_API_SECRET_KEY, data_url=f"{ALPACA_DATA_BASE}/v2"
+)
+
 
 # ===========================
 # HTTP / ALPACA HELPERS
 # ===========================
 
 
-def safe_get(url, headers, params, retries=5):
-    """Requests GET with retries + backoff."""
-    for attempt in range(retries):
-        try:
-            resp = requests.get(url, params=params, headers=headers, timeout=10)
-            resp.raise_for_status()
-            return resp
-        except Exception as e:
-            wait = (2 ** attempt) + random.uniform(0, 1)
-            print(f"[Retry {attempt+1}] Error: {e} — waiting {wait:.2f}s")
-            time.sleep(wait)
-    raise RuntimeError("Max retries exceeded for Alpaca request")
-
-
 def fetch_daily_bars_range(symbols, start_date: dt.date, end_date: dt.date):
     """
     Fetch daily bars for all symbols between [start_date, end_date].
 
-    Uses:
-      /v2/stocks/bars?symbols=...&timeframe=1D&start=...&end=...&limit=1000&adjustment=raw&feed=iex&sort=asc
+    Uses the shared market-data client (pooled session, rate limiting,
+    retry/backoff and next_page_token pagination) against:
+      /v2/stocks/bars?symbols=...&timeframe=1D&start=...&end=...&adjustment=raw&feed=iex&sort=asc
 
     Returns:
       dict: { symbol: [ {t, o, h, l, c, v, ...}, ... ] } (sorted oldest -> newest)
     """
-    symbols = list({s for s in symbols if s})
-    if not symbols:
-        return {}
-
     start_iso = start_date.strftime("%Y-%m-%d") + "T00:00:00Z"
     end_iso = end_date.strftime("%Y-%m-%d") + "T00:00:00Z"
 
-    url = f"{ALPACA_DATA_BASE}/v2/stocks/bars"
-    params = {
-        "symbols": ",".join(symbols),
-        "timeframe": "1D",
-        "start": start_iso,
-        "end": end_iso,
-        "limit": 1000,
-        "adjustment": "raw",
-        "feed": "iex",
-        "sort": "asc",
-    }
-    headers = {
-        "accept": "application/json",
-        "APCA-API-KEY-ID": APCA_API_KEY_ID,
-        "APCA-API-SECRET-KEY": APCA_API_SECRET_KEY,
-    }
-
-    resp = safe_get(url, headers=headers, params=params)
-    data = resp.json()
+    return market_data.get_bars(symbols, "1D", start_iso, end_iso)
 
-    bars_by_symbol = data.get("bars") or {}
-    result = {}
 
-    if isinstance(bars_by_symbol, dict):
-        for sym, bar_list in bars_by_symbol.items():
-            if not bar_list:
-                continue
-            # Ensure sorted by time
-            bar_list = sorted(bar_list, key=lambda b: b.get("t"))
-            result[sym] = bar_list
+def load_closes_from_bar_store(symbols, start_date: dt.date, end_date: dt.date):
+    """
+    Read closes for [start_date, end_date] from the local bar store.
 
-    return result
+    Returns closes_by_symbol ({symbol: {date: close}}, same shape as
+    build_symbol_closes) or None if any symbol is missing from the store.
+    """
+    closes_by_symbol = {}
+    for sym in {s for s in symbols if s}:
+        bars = bar_store.read_daily(sym, start_date, end_date)
+        if bars is None:
+            return None
+        if len(bars.day) == 0:
+            continue
+        dates = bars.day.astype("datetime64[D]").astype(str).tolist()
+        closes_by_symbol[sym] = dict(zip(dates, bars.close.tolist()))
+    return closes_by_symbol
 
 
 # ===========================
@@ -100,24 +114,33 @@ def fetch_daily_bars_range(symbols, start_date: dt.date, end_date: dt.date):
 
 def load_alpaca_strategies():
     """Return strategies that use Alpaca as data source."""
-    res = (
-        supabase.table("strategies").select("id").eq("data_source", "Alpaca").execute()
+    return list(
+        iter_rows(supabase, "strategies", "id", key="id", filters=[("eq", "data_source", "Alpaca")])
     )
-    return res.data or []
 
 
 def load_strategy_metrics(strategy_id: str):
+    columns = (
+        "portfolio_holdings, series_all, series_1m, series_3m, series_6m, "
+        "series_1y, series_3y, series_ytd, calendar_returns, perf_summary, perf_state"
+    )
+    if WINDOW_INDEX_ENABLED:
+        columns += ", series_windows"
     res = (
         supabase.table("strategy_metrics")
-        .select(
-            "portfolio_holdings, series_all, series_1m, series_3m, series_6m, "
-            "series_1y, series_3y, series_ytd, calendar_returns, perf_summary"
-        )
+        .select(columns)
         .eq("strategy_id", strategy_id)
         .single()
         .execute()
     )
-    return res.data or {}
+    data = res.data or {}
+    if PARTIAL_WRITES:
+        metrics_fingerprints.seed(strategy_id, data, "strategy_id")
+    # Accept the legacy list layout, the compact encoding and the window index
+    data.update(decode_window_columns(data))
+    if "series_all" in data:
+        data["series_all"] = decode_series(data["series_all"])
+    return data
 
 
 def save_strategy_metrics(strategy_id: str, payload: dict):
@@ -236,51 +259,120 @@ def compute_portfolio_daily_returns(ret_by_symbol, holdings):
 
 
 # ===========================
-# SERIES WINDOW HELPERS
+# VECTORISED RETURN KERNELS
 # ===========================
 
 
-def filter_series_by_date(series_all, start_date: dt.date):
-    """Return points with date >= start_date."""
-    out = []
-    for pt in series_all:
-        d_str = pt.get("date")
-        if not d_str:
+def build_close_matrix(closes_by_symbol):
+    """
+    Align {symbol: {date: close}} on a shared sorted date index.
+
+    Returns (dates, symbols, closes) where closes is a float64 array of
+    shape (len(dates), len(symbols)) with NaN where a symbol has no bar.
+    Symbol order follows closes_by_symbol.
+    """
+    symbols = list(closes_by_symbol.keys())
+    dates = sorted({d for date_to_close in closes_by_symbol.values() for d in date_to_close})
+    date_idx = {d: i for i, d in enumerate(dates)}
+
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for j, sym in enumerate(symbols):
+        date_to_close = {d: c for d, c in closes_by_symbol[sym].items() if c is not None}
+        n = len(date_to_close)
+        rows = np.fromiter((date_idx[d] for d in date_to_close), dtype=np.intp, count=n)
+        closes[rows, j] = np.fromiter(date_to_close.values(), dtype=np.float64, count=n)
+    return dates, symbols, closes
+
+
+def compute_return_matrix(closes):
+    """
+    Per-symbol daily returns on the shared index: close / previous close of
+    the SAME symbol - 1, NaN where the symbol has no bar, no earlier bar,
+    or a zero previous close (same rules as compute_symbol_daily_returns).
+    """
+    n_dates, n_symbols = closes.shape
+    if n_dates == 0:
+        return closes.copy()
+
+    valid = ~np.isnan(closes)
+    row = np.arange(n_dates)[:, None]
+    last_valid = np.maximum.accumulate(np.where(valid, row, -1), axis=0)
+
+    # index of the previous bar strictly before each row
+    prev_idx = np.vstack([np.full((1, n_symbols), -1), last_valid[:-1]])
+    has_prev = prev_idx >= 0
+    prev = np.take_along_axis(closes, np.where(has_prev, prev_idx, 0), axis=0)
+
+    ok = valid & has_prev & (prev != 0)
+    returns = np.full_like(closes, np.nan)
+    returns[ok] = (closes[ok] / prev[ok]) - 1.0
+    return returns
+
+
+def compute_portfolio_returns_vectorized(closes_by_symbol, holdings):
+    """
+    NumPy equivalent of compute_symbol_daily_returns followed by
+    compute_portfolio_daily_returns, with identical output.
+
+    The weighted sum runs across symbols in the same order as the loop
+    version (vectorised over dates), so results match bit for bit.
+
+    Returns (portfolio_series, symbol_last_daily), or None when no symbol
+    has a daily return.
+    """
+    dates, symbols, closes = build_close_matrix(closes_by_symbol)
+    returns = compute_return_matrix(closes)
+    has_return = ~np.isnan(returns)
+
+    if not has_return.any():
+        return None
+
+    # map symbol -> weight (0–1), same parsing as compute_portfolio_daily_returns
+    weights = {}
+    for h in holdings:
+        sym = h.get("symbol")
+        w = h.get("weight_pct")
+        if not sym or w is None:
             continue
         try:
-            d = dt.date.fromisoformat(d_str)
-        except ValueError:
+            weights[sym] = float(w) / 100.0
+        except (TypeError, ValueError):
             continue
-        if d >= start_date:
-            out.append(pt)
-    return out
 
+    num = np.zeros(len(dates))
+    den = np.zeros(len(dates))
+    symbol_last_daily = {}
+
+    for j, sym in enumerate(symbols):
+        w = weights.get(sym)
+        if w is None:
+            continue
+        used = has_return[:, j]
+        if not used.any():
+            continue
+        num[used] += w * returns[used, j]
+        den[used] += w
+        symbol_last_daily[sym] = float(returns[np.flatnonzero(used)[-1], j])
+
+    # dates where at least one symbol has a return (the loop version's date set)
+    on_index = has_return.any(axis=1)
+    keep = on_index & (den > 0)
+
+    portfolio_series = [
+        {"date": dates[i], "pct": float(num[i] / den[i])}
+        for i in np.flatnonzero(keep)
+    ]
+    return portfolio_series, symbol_last_daily
 
-def build_all_windows(series_all):
-    """Build 1m, 3m, 6m, 1y, 3y, ytd from series_all."""
-    today = dt.date.today()
-    out = {
-        "series_1m": [],
-        "series_3m": [],
-        "series_6m": [],
-        "series_1y": [],
-        "series_3y": [],
-        "series_ytd": [],
-    }
-    if not series_all:
-        return out
 
-    out["series_1m"] = filter_series_by_date(series_all, today - dt.timedelta(days=31))
-    out["series_3m"] = filter_series_by_date(series_all, today - dt.timedelta(days=93))
-    out["series_6m"] = filter_series_by_date(series_all, today - dt.timedelta(days=186))
-    out["series_1y"] = filter_series_by_date(series_all, today - dt.timedelta(days=365))
-    out["series_3y"] = filter_series_by_date(series_all, today - dt.timedelta(days=365 * 3))
+# ===========================
+# SERIES WINDOW HELPERS
+# ===========================
 
-    # YTD
-    ytd_start = dt.date(today.year, 1, 1)
-    out["series_ytd"] = filter_series_by_date(series_all, ytd_start)
 
-    return out
+def build_all_windows(series_all):
+    """Build 1m, 3m, 6m, 1y, 3y, ytd from series_all."""
+    return slice_windows(series_all, dt.date.today(), ALPACA_WINDOW_DAYS, include_1d=False)
 
 
 # ===========================
@@ -294,92 +386,31 @@ def build_calendar_returns(series_all):
 
     pct stored as DECIMAL (e.g. 0.01 for 1%).
     """
-    cal = []
-    for pt in series_all:
-        d_str = pt.get("date")
-        pct = pt.get("pct")
-        if d_str is None or pct is None:
-            continue
-        try:
-            d = dt.date.fromisoformat(d_str)
-            pct_val = float(pct)
-        except Exception:
-            continue
-        cal.append(
-            {
-                "year": d.year,
-                "month": d.month,
-                "day": d.day,
-                "pct": pct_val,  # decimal, NOT percent
-            }
-        )
-    return cal
+    return calendar_rows(parse_daily_returns(series_all), DECIMAL)
 
 
-def build_perf_summary(series_all):
+def build_perf_summary(series_all, previous_state=None):
     """
-    Build perf_summary based on series_all.
+    Build (perf_summary, perf_state) based on series_all (sorted by date).
     Uses pct as decimal (e.g. 0.01 for 1%), but stores *_pct fields in percent units.
+
+    With INCREMENTAL_PERF_SUMMARY the running statistics are resumed from
+    previous_state and only new days are folded in; otherwise perf_state is None.
     """
     if not series_all:
-        return {}
-
-    daily = []
-    for pt in series_all:
-        pct = pt.get("pct")
-        d_str = pt.get("date")
-        if pct is None or d_str is None:
-            continue
-        try:
-            daily.append((dt.date.fromisoformat(d_str), float(pct)))
-        except Exception:
-            continue
-
-    if not daily:
-        return {}
-
-    daily.sort(key=lambda x: x[0])
-    dates = [d for d, _ in daily]
-    rets = [r for _, r in daily]
-
-    total_days = len(rets)
-    best_idx = max(range(total_days), key=lambda i: rets[i])
-    worst_idx = min(range(total_days), key=lambda i: rets[i])
-
-    best_day_pct_dec = rets[best_idx]
-    worst_day_pct_dec = rets[worst_idx]
-
-    best_day_date = dates[best_idx].isoformat()
-    worst_day_date = dates[worst_idx].isoformat()
+        return {}, None
 
-    days_positive = sum(1 for r in rets if r > 0)
-    days_negative = sum(1 for r in rets if r < 0)
+    acc = PerfAccumulator.from_state(previous_state if INCREMENTAL_PERF_SUMMARY else None)
+    stats = acc.sync(series_all)
+    state = acc.to_state() if INCREMENTAL_PERF_SUMMARY else None
 
-    positive_days_pct = days_positive / total_days * 100.0
-    negative_days_pct = days_negative / total_days * 100.0
+    if stats.count == 0:
+        return {}, state
 
-    avg_daily_return_dec = sum(rets) / total_days
-    avg_daily_return_pct = avg_daily_return_dec * 100.0
+    summary = stats.summary_fields(dt.date.today())
 
-    # YTD cumulative
-    today = dt.date.today()
-    ytd_start = dt.date(today.year, 1, 1)
-    ytd_rets = [r for (d, r) in daily if d >= ytd_start]
-    ytd_cum_dec = 0.0
-    if ytd_rets:
-        cum = 1.0
-        for r in ytd_rets:
-            cum *= (1.0 + r)
-        ytd_cum_dec = cum - 1.0
-    ytd_return_pct = ytd_cum_dec * 100.0
-
-    # std dev of daily returns (decimal)
-    if len(rets) > 1:
-        mean = avg_daily_return_dec
-        var = sum((r - mean) ** 2 for r in rets) / (len(rets) - 1)
-        std_dec = math.sqrt(var)
-    else:
-        std_dec = 0.0
+    # std dev of daily returns (decimal, sample)
+    std_dec = stats.stdev(ddof=1)
 
     # risk_level based on volatility
     if std_dec < 0.005:
@@ -389,6 +420,9 @@ def build_perf_summary(series_all):
     else:
         risk_level = "Aggressive"
 
+    positive_days_pct = summary["positive_days_pct"]
+    negative_days_pct = summary["negative_days_pct"]
+
     # stability_tier based on distribution of positive vs negative days
     if negative_days_pct < 40:
         stability_tier = "Stable"
@@ -405,36 +439,20 @@ def build_perf_summary(series_all):
     )
 
     k = 25
-    tail = rets[-k:] if len(rets) > k else rets
-    if tail:
-        typical_day_dec = sum(abs(r) for r in tail) / len(tail)
-    else:
-        typical_day_dec = 0.0
-    typical_day_pct = typical_day_dec * 100.0
+    typical_day_pct = stats.mean_abs_tail_pct(k)
 
-    summary = {
+    summary.update({
         "risk_level": risk_level,
-        "total_days": total_days,
-        "best_day_pct": best_day_pct_dec * 100.0,
-        "best_day_date": best_day_date,
-        "days_negative": days_negative,
-        "days_positive": days_positive,
-        "worst_day_pct": worst_day_pct_dec * 100.0,
         "stability_tier": stability_tier,
-        "worst_day_date": worst_day_date,
-        "ytd_return_pct": ytd_return_pct,
-        "negative_days_pct": negative_days_pct,
-        "positive_days_pct": positive_days_pct,
         "stability_numeric": stability_numeric,
-        "avg_daily_return_pct": avg_daily_return_pct,
         "stability_components": {
             "k": k,
-            "worst_day_pct": worst_day_pct_dec * 100.0,
+            "worst_day_pct": summary["worst_day_pct"],
             "typical_day_pct": typical_day_pct,
         },
-    }
+    })
 
-    return summary
+    return summary, state
 
 
 # ===========================
@@ -442,7 +460,7 @@ def build_perf_summary(series_all):
 # ===========================
 
 
-def process_strategy(strategy_id: str):
+def process_strategy(strategy_id: str, writer: BulkUpsertWriter | None = None):
     metrics = load_strategy_metrics(strategy_id)
     holdings = metrics.get("portfolio_holdings") or []
     existing_series_all = metrics.get("series_all") or []
@@ -488,24 +506,34 @@ def process_strategy(strategy_id: str):
             f"\n[INFO] Fetching bars for strategy {strategy_id} from {start_date} to {end_date}"
         )
 
-        bars_by_symbol = fetch_daily_bars_range(symbols, start_date, end_date)
-        if not bars_by_symbol:
+        closes_by_symbol = None
+        if USE_BAR_STORE:
+            closes_by_symbol = load_closes_from_bar_store(symbols, start_date, end_date)
+        if closes_by_symbol is None:
+            closes_by_symbol = build_symbol_closes(
+                fetch_daily_bars_range(symbols, start_date, end_date)
+            )
+
+        if not closes_by_symbol:
             print(f"[WARN] No bar data from Alpaca for strategy {strategy_id}")
             combined_series_all = sorted(existing_series_all, key=lambda x: x.get("date", ""))
         else:
-            closes_by_symbol = build_symbol_closes(bars_by_symbol)
-            ret_by_symbol = compute_symbol_daily_returns(closes_by_symbol)
+            if VECTORIZED_RETURNS:
+                portfolio_result = compute_portfolio_returns_vectorized(closes_by_symbol, holdings)
+            else:
+                ret_by_symbol = compute_symbol_daily_returns(closes_by_symbol)
+                portfolio_result = (
+                    compute_portfolio_daily_returns(ret_by_symbol, holdings) if ret_by_symbol else None
+                )
 
-            if not ret_by_symbol:
+            if portfolio_result is None:
                 print(f"[WARN] No daily returns computed for strategy {strategy_id}")
                 combined_series_all = sorted(
                     existing_series_all, key=lambda x: x.get("date", "")
                 )
             else:
                 # portfolio series for the fetched range
-                series_range, symbol_last_daily = compute_portfolio_daily_returns(
-                    ret_by_symbol, holdings
-                )
+                series_range, symbol_last_daily = portfolio_result
 
                 # filter only dates strictly after last_date (if any)
                 if last_date is not None:
@@ -543,35 +571,49 @@ def process_strategy(strategy_id: str):
     calendar_returns = build_calendar_returns(combined_series_all)
 
     # perf_summary from series_all (decimal)
-    perf_summary = build_perf_summary(combined_series_all)
+    perf_summary, perf_state = build_perf_summary(combined_series_all, metrics.get("perf_state"))
 
     payload = {
-        "series_all": combined_series_all,
-        "series_1m": windows["series_1m"],
-        "series_3m": windows["series_3m"],
-        "series_6m": windows["series_6m"],
-        "series_1y": windows["series_1y"],
-        "series_3y": windows["series_3y"],
-        "series_ytd": windows["series_ytd"],
+        "series_all": encode_for_storage(combined_series_all),
+        **window_columns(combined_series_all, windows),
         "calendar_returns": calendar_returns,
         "perf_summary": perf_summary,
+        **({"perf_state": perf_state} if perf_state is not None else {}),
         "portfolio_holdings": holdings,
+        # readers such as the demo engine's series cache key on updated_at
+        "updated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
     }
 
-    save_strategy_metrics(strategy_id, payload)
-    print(f"[OK] Updated metrics for strategy {strategy_id}")
+    if writer is not None:
+        if writer.add({"strategy_id": strategy_id, **payload}):
+            print(f"[OK] Queued metrics for strategy {strategy_id}")
+        else:
+            print(f"[OK] Metrics for strategy {strategy_id} unchanged")
+    else:
+        save_strategy_metrics(strategy_id, payload)
+        print(f"[OK] Updated metrics for strategy {strategy_id}")
 
 
 def main():
     strategies = load_alpaca_strategies()
     print(f"Found {len(strategies)} Alpaca strategies")
 
-    for s in strategies:
-        sid = s["id"]
-        try:
-            process_strategy(sid)
-        except Exception as e:
-            print(f"[ERROR] Strategy {sid}: {e}")
+    with BulkUpsertWriter(
+        supabase,
+        "strategy_metrics",
+        key="strategy_id",
+        batch_size=WRITE_BATCH_SIZE,
+        fingerprints=metrics_fingerprints if PARTIAL_WRITES else None,
+        required_columns=STRATEGY_REQUIRED_COLUMNS,
+    ) as writer:
+        for s in strategies:
+            sid = s["id"]
+            try:
+                process_strategy(sid, writer)
+            except Exception as e:
+                print(f"[ERROR] Strategy {sid}: {e}")
+
+    writer.report()
 
 
 if __name__ == "__main__":
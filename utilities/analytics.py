@@ -0,0 +1,192 @@
+import datetime as dt
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+# ==========================
+# UNIT CONVENTIONS
+# ==========================
+#
+# - Returns are DECIMAL inside every kernel (0.01 == 1%).
+# - Kernels that produce stored fields take an explicit `unit`, because the
+#   engines' stored contracts differ and the frontend reads them as-is:
+#     strategy_metrics.calendar_returns   PERCENT  (update_strategies_engine.py)
+#                                         DECIMAL  (alpaca_metrics.py)
+#     perf_summary *_pct fields           PERCENT  (both engines)
+# - perf_summary statistics live in perf_accumulator.py, which builds on
+#   running_stats() and compound_growth(); callers of its stdev() pass
+#   `ddof` explicitly: 0 (population) in the strategies engine, 1 (sample)
+#   in alpaca_metrics.py.
+# - Dates are sorted ascending; kernels never re-sort. DailyReturns carries
+#   them both as dt.date (for callers) and as datetime64[D] (for kernels).
+
+DECIMAL = "decimal"
+PERCENT = "percent"
+
+_UNIT_SCALE = {DECIMAL: 1.0, PERCENT: 100.0}
+
+
+class DailyReturns(NamedTuple):
+    dates: List[dt.date]
+    returns: np.ndarray  # float64, decimal, aligned with dates
+    days: np.ndarray  # datetime64[D], aligned with dates
+
+
+def unit_scale(unit: str) -> float:
+    try:
+        return _UNIT_SCALE[unit]
+    except KeyError:
+        raise ValueError(f"unknown unit '{unit}', expected '{DECIMAL}' or '{PERCENT}'") from None
+
+
+# ================ PARSING ===================
+
+# Byte offsets of the digits in "YYYY-MM-DD"
+_ISO_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+
+
+def _parse_days(d_strs: List[Any]) -> np.ndarray:
+    """
+    datetime64[D] per entry, NaT where dt.date.fromisoformat() rejects it.
+    Entries shaped exactly YYYY-MM-DD are parsed by numpy as one column;
+    anything else (other ISO forms, non-strings, impossible dates) goes
+    through fromisoformat() on its own.
+    """
+    n = len(d_strs)
+    days = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    exact = np.zeros(n, dtype=bool)
+    try:
+        # one byte past YYYY-MM-DD, so longer strings do not match
+        raw = np.array(d_strs, dtype="S11")
+    except (TypeError, ValueError):
+        raw = None
+
+    if raw is not None and raw.shape == (n,):
+        chars = raw.view(np.uint8).reshape(n, 11)
+        digits = chars[:, _ISO_DIGITS] - np.uint8(ord("0"))  # wraps for non-digits
+        exact = (
+            (digits < 10).all(axis=1)
+            & (digits[:, :4] > 0).any(axis=1)  # year 0000 is not a date
+            & (chars[:, 4] == ord("-")) & (chars[:, 7] == ord("-")) & (chars[:, 10] == 0)
+        )
+        try:
+            days[exact] = raw[exact].astype("datetime64[D]")
+        except ValueError:
+            # an impossible month or day somewhere; leave the column to fromisoformat()
+            exact[:] = False
+
+    for i in np.flatnonzero(~exact).tolist():
+        try:
+            days[i] = dt.date.fromisoformat(d_strs[i])
+        except (TypeError, ValueError):
+            pass
+    return days
+
+
+def _parse_values(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """(float64 values, valid mask); invalid where the entry is None or float() rejects it."""
+    try:
+        parsed = np.array(values, dtype=np.float64)
+        if parsed.shape == (len(values),):
+            valid = np.ones(len(values), dtype=bool)
+            # numpy reads None as NaN; genuine NaNs stay
+            for i in np.flatnonzero(np.isnan(parsed)).tolist():
+                valid[i] = values[i] is not None
+            return parsed, valid
+    except (TypeError, ValueError):
+        pass
+
+    parsed = np.zeros(len(values))
+    valid = np.ones(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            parsed[i] = float(value)
+        except (TypeError, ValueError):
+            valid[i] = False
+    return parsed, valid
+
+
+def parse_daily_returns(points: List[Any], value_key: str = "pct", date_key: str = "date") -> DailyReturns:
+    """
+    [{date_key, value_key}, ...] -> DailyReturns: dates and values are
+    parsed as whole columns, invalid points are dropped and the rest sorted
+    by date (stable, so later duplicates stay later).
+    """
+    entries = [e for e in points or () if isinstance(e, dict)]
+    days = _parse_days([e.get(date_key) for e in entries])
+    returns, valid = _parse_values([e.get(value_key) for e in entries])
+
+    keep = valid & ~np.isnat(days)
+    days, returns = days[keep], returns[keep]
+    order = np.argsort(days, kind="stable")
+    days, returns = days[order], returns[order]
+    return DailyReturns(days.tolist(), returns, days)
+
+
+# ================ KERNELS ===================
+
+def calendar_rows(series: DailyReturns, unit: str) -> List[Dict[str, Any]]:
+    """[{year, month, day, pct}] with pct in `unit`; fields come from datetime64 arithmetic."""
+    months = series.days.astype("datetime64[M]")
+    year, month = np.divmod(months.astype(np.int64), 12)
+    year = (year + 1970).tolist()
+    month = (month + 1).tolist()
+    day = ((series.days - months).astype(np.int64) + 1).tolist()
+    values = (series.returns * unit_scale(unit)).tolist()
+    return [
+        {"year": y, "month": m, "day": d, "pct": v}
+        for y, m, d, v in zip(year, month, day, values)
+    ]
+
+
+def running_stats(returns: np.ndarray) -> Dict[str, Any]:
+    """
+    Moments and counts of a decimal return vector, in the same shape as the
+    incremental state in perf_accumulator.py: count, mean, m2 (sum of
+    squared deviations), total, days_positive, days_negative and the first
+    index of the best and worst day.
+    """
+    n = len(returns)
+    if n == 0:
+        return {
+            "count": 0, "mean": 0.0, "m2": 0.0, "total": 0.0,
+            "days_positive": 0, "days_negative": 0, "best_idx": None, "worst_idx": None,
+        }
+
+    total = float(returns.sum())
+    mean = total / n
+    dev = returns - mean
+    return {
+        "count": n,
+        "mean": mean,
+        "m2": float(dev @ dev),
+        "total": total,
+        "days_positive": int(np.count_nonzero(returns > 0)),
+        "days_negative": int(np.count_nonzero(returns < 0)),
+        "best_idx": int(np.argmax(returns)),
+        "worst_idx": int(np.argmin(returns)),
+    }
+
+
+def compound_growth(returns: np.ndarray) -> float:
+    """prod(1 + r) - 1, decimal."""
+    if len(returns) == 0:
+        return 0.0
+    return float(np.prod(1.0 + returns)) - 1.0
+
+
+def compound_values(start_value: float, returns: np.ndarray) -> np.ndarray:
+    """
+    Value after each day when start_value compounds by `returns`. Multiplies
+    left to right exactly like `v = v * (1 + r)` in a loop.
+    """
+    factors = np.empty(len(returns) + 1)
+    factors[0] = start_value
+    np.add(returns, 1.0, out=factors[1:])
+    return np.multiply.accumulate(factors)[1:]
+
+
+def cumulative_growth(returns: np.ndarray) -> np.ndarray:
+    """G with G[0] = 1 and G[i + 1] = G[i] * (1 + returns[i]); len(returns) + 1 entries."""
+    return np.concatenate(([1.0], compound_values(1.0, returns)))
+
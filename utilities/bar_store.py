@@ -0,0 +1,271 @@
+import datetime as dt
+import os
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+import numpy as np
+
+# ==========================
+# CONFIG
+# ==========================
+
+BAR_STORE_DIR = os.environ.get(
+    "ALGOHIVE_BAR_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "bars"),
+)
+
+# Layout (one structured-array .npy per partition, memory-mapped on read;
+# each column is a field of the record array):
+#   <root>/daily/<SYMBOL>/bars.npy
+#       day = int32 days since 1970-01-01, sorted ascending, unique
+#   <root>/minute/<SYMBOL>/<YYYY-MM-DD>/bars.npy
+#       minute = int64 minutes since 1970-01-01T00:00Z, one partition per UTC day
+
+DAILY_COLUMNS = ("day", "open", "close", "pct")
+MINUTE_COLUMNS = ("minute", "open", "close", "pct")
+
+BARS_FILE = "bars.npy"
+
+_EPOCH = dt.date(1970, 1, 1)
+
+
+class DailyBars(NamedTuple):
+    day: np.ndarray
+    open: np.ndarray
+    close: np.ndarray
+    pct: np.ndarray
+
+
+class MinuteBars(NamedTuple):
+    minute: np.ndarray
+    open: np.ndarray
+    close: np.ndarray
+    pct: np.ndarray
+
+
+# ================ TIME HELPERS ===================
+
+def date_to_epoch_day(d: dt.date) -> int:
+    return (d - _EPOCH).days
+
+
+def epoch_day_to_date(day: int) -> dt.date:
+    return _EPOCH + dt.timedelta(days=int(day))
+
+
+def iso_to_epoch_minute(ts: str) -> int:
+    """'2024-01-02T14:30:00Z' (or with offset) -> minutes since epoch (UTC)."""
+    t = dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.timezone.utc)
+    return int(t.timestamp()) // 60
+
+
+def epoch_minute_to_iso(minute: int) -> str:
+    t = dt.datetime.fromtimestamp(int(minute) * 60, tz=dt.timezone.utc)
+    return t.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+# ================ STORE ===================
+
+class BarStore:
+    """
+    Local on-disk columnar store for daily and 1-minute bars.
+
+    Writers merge new bars into a partition (later bars overwrite earlier
+    ones for the same day/minute) and replace its single file with one
+    os.replace, so a reader in any process maps either the old or the new
+    version of every column, never a mix. The lock only orders writers
+    within one process; the read-merge-replace of a partition assumes a
+    single writer process (the universe updater). Readers get memory-mapped
+    arrays; range reads are zero-copy slices located with a binary search
+    on the sorted time column.
+    """
+
+    def __init__(self, root: str = BAR_STORE_DIR):
+        self.root = os.path.abspath(root)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # ---------------- paths / io ----------------
+
+    def _daily_dir(self, symbol: str) -> str:
+        return os.path.join(self.root, "daily", symbol)
+
+    def _minute_dir(self, symbol: str, day: dt.date | None = None) -> str:
+        base = os.path.join(self.root, "minute", symbol)
+        return base if day is None else os.path.join(base, day.isoformat())
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    @staticmethod
+    def _load(path: str, columns: Iterable[str]) -> Dict[str, np.ndarray] | None:
+        file = os.path.join(path, BARS_FILE)
+        if not os.path.exists(file):
+            return None
+        # one map of one file: every column comes from the same version
+        records = np.load(file, mmap_mode="r")
+        return {c: records[c] for c in columns}
+
+    @staticmethod
+    def _save(path: str, arrays: Dict[str, np.ndarray]) -> None:
+        os.makedirs(path, exist_ok=True)
+        records = np.empty(
+            len(next(iter(arrays.values()))),
+            dtype=[(name, arr.dtype) for name, arr in arrays.items()],
+        )
+        for name, arr in arrays.items():
+            records[name] = arr
+
+        final = os.path.join(path, BARS_FILE)
+        tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp, final)
+
+    @staticmethod
+    def _merge(existing: Dict[str, np.ndarray] | None, new: Dict[str, np.ndarray], key: str) -> Dict[str, np.ndarray]:
+        """Union by `key`, new values winning on collisions; result sorted by key."""
+        if existing is None or len(existing[key]) == 0:
+            merged = new
+        else:
+            merged = {c: np.concatenate([np.asarray(existing[c]), new[c]]) for c in new}
+        # keep the LAST occurrence of each key: unique() on the reversed array
+        rev_keys = merged[key][::-1]
+        _, rev_idx = np.unique(rev_keys, return_index=True)
+        idx = len(rev_keys) - 1 - rev_idx
+        return {c: np.ascontiguousarray(merged[c][idx]) for c in merged}
+
+    @staticmethod
+    def _bars_to_columns(bars: Iterable[Dict[str, Any]], key: str, to_key) -> Dict[str, np.ndarray] | None:
+        keys: List[int] = []
+        opens: List[float] = []
+        closes: List[float] = []
+        for bar in bars:
+            t = bar.get("t")
+            o = bar.get("o")
+            c = bar.get("c")
+            if t is None or o is None or c is None:
+                continue
+            try:
+                keys.append(to_key(t))
+            except ValueError:
+                continue
+            opens.append(float(o))
+            closes.append(float(c))
+
+        if not keys:
+            return None
+
+        o_arr = np.asarray(opens, dtype=np.float64)
+        c_arr = np.asarray(closes, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(o_arr == 0, 0.0, (c_arr - o_arr) / o_arr)
+
+        key_dtype = np.int32 if key == "day" else np.int64
+        return {key: np.asarray(keys, dtype=key_dtype), "open": o_arr, "close": c_arr, "pct": pct}
+
+    # ---------------- daily ----------------
+
+    def append_daily(self, symbol: str, bars: Iterable[Dict[str, Any]]) -> int:
+        """Merge Alpaca daily bars ({t, o, c, ...}) into the symbol's store. Returns stored day count."""
+        new = self._bars_to_columns(
+            bars, "day", lambda t: date_to_epoch_day(dt.date.fromisoformat(t[:10]))
+        )
+        path = self._daily_dir(symbol)
+        with self._lock(symbol):
+            existing = self._load(path, DAILY_COLUMNS)
+            if new is None:
+                return 0 if existing is None else len(existing["day"])
+            merged = self._merge(existing, new, "day")
+            self._save(path, merged)
+            return len(merged["day"])
+
+    def read_daily(self, symbol: str, start: dt.date | None = None, end: dt.date | None = None) -> DailyBars | None:
+        """Memory-mapped daily columns for start <= date <= end (both optional), or None."""
+        arrays = self._load(self._daily_dir(symbol), DAILY_COLUMNS)
+        if arrays is None:
+            return None
+
+        days = arrays["day"]
+        lo = 0 if start is None else int(np.searchsorted(days, date_to_epoch_day(start), side="left"))
+        hi = len(days) if end is None else int(np.searchsorted(days, date_to_epoch_day(end), side="right"))
+        return DailyBars(*(arrays[c][lo:hi] for c in DAILY_COLUMNS))
+
+    def has_daily(self, symbol: str) -> bool:
+        return os.path.exists(os.path.join(self._daily_dir(symbol), BARS_FILE))
+
+    def daily_symbols(self) -> List[str]:
+        path = os.path.join(self.root, "daily")
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    # ---------------- minute ----------------
+
+    def append_minutes(self, symbol: str, bars: Iterable[Dict[str, Any]]) -> int:
+        """Merge Alpaca 1-minute bars into per-UTC-day partitions. Returns bars written."""
+        new = self._bars_to_columns(bars, "minute", iso_to_epoch_minute)
+        if new is None:
+            return 0
+
+        partition_day = new["minute"] // (24 * 60)
+        written = 0
+        with self._lock(symbol):
+            for day in np.unique(partition_day):
+                mask = partition_day == day
+                part = {c: new[c][mask] for c in new}
+                path = self._minute_dir(symbol, epoch_day_to_date(day))
+                merged = self._merge(self._load(path, MINUTE_COLUMNS), part, "minute")
+                self._save(path, merged)
+                written += int(mask.sum())
+        return written
+
+    def read_minutes(self, symbol: str, start_minute: int, end_minute: int) -> MinuteBars | None:
+        """Minute columns for start_minute <= minute < end_minute, concatenated across partitions."""
+        base = self._minute_dir(symbol)
+        if not os.path.isdir(base):
+            return None
+
+        first_day = epoch_day_to_date(start_minute // (24 * 60))
+        last_day = epoch_day_to_date((end_minute - 1) // (24 * 60))
+
+        parts: List[MinuteBars] = []
+        for name in sorted(os.listdir(base)):
+            try:
+                day = dt.date.fromisoformat(name)
+            except ValueError:
+                continue
+            if day < first_day or day > last_day:
+                continue
+            arrays = self._load(os.path.join(base, name), MINUTE_COLUMNS)
+            if arrays is None:
+                continue
+            minutes = arrays["minute"]
+            lo = int(np.searchsorted(minutes, start_minute, side="left"))
+            hi = int(np.searchsorted(minutes, end_minute, side="left"))
+            if hi > lo:
+                parts.append(MinuteBars(*(arrays[c][lo:hi] for c in MINUTE_COLUMNS)))
+
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        return MinuteBars(*(np.concatenate([getattr(p, c) for p in parts]) for c in MINUTE_COLUMNS))
+
+    def prune_minutes(self, symbol: str, keep_from: dt.date) -> None:
+        """Drop minute partitions older than keep_from."""
+        base = self._minute_dir(symbol)
+        if not os.path.isdir(base):
+            return
+        with self._lock(symbol):
+            for name in os.listdir(base):
+                try:
+                    day = dt.date.fromisoformat(name)
+                except ValueError:
+                    continue
+                if day < keep_from:
+                    path = os.path.join(base, name)
+                    for f in os.listdir(path):
+                        os.remove(os.path.join(path, f))
+                    os.rmdir(path)
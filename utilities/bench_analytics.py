@@ -0,0 +1,170 @@
+import datetime as dt
+import json
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from analytics import (
+    PERCENT,
+    calendar_rows,
+    compound_growth,
+    compound_values,
+    cumulative_growth,
+    parse_daily_returns,
+    running_stats,
+)
+from perf_accumulator import PerfAccumulator
+from series_windows import STRATEGY_WINDOW_DAYS, slice_windows
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Synthetic series length: ~3 years of calendar days, like series_all
+SERIES_DAYS = 3 * 365
+
+# Each case runs this many times; the best run is reported
+REPEATS = 50
+
+RANDOM_SEED = 7
+
+
+def make_series(days: int) -> List[Dict[str, Any]]:
+    rng = random.Random(RANDOM_SEED)
+    start = dt.date.today() - dt.timedelta(days=days - 1)
+    return [
+        {"date": (start + dt.timedelta(days=i)).isoformat(), "pct": rng.gauss(0.0005, 0.01)}
+        for i in range(days)
+    ]
+
+
+def best_of(fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# ================ PURE-PYTHON BASELINES ===================
+# The loops the engines ran before analytics.py and perf_accumulator.py.
+
+def py_parse(series_all):
+    data = []
+    for e in series_all:
+        if not isinstance(e, dict):
+            continue
+        d_str = e.get("date")
+        pct = e.get("pct")
+        if d_str is None or pct is None:
+            continue
+        try:
+            data.append((dt.date.fromisoformat(d_str), float(pct)))
+        except Exception:
+            continue
+    data.sort(key=lambda x: x[0])
+    return data
+
+
+def py_calendar(pairs):
+    return [{"year": d.year, "month": d.month, "day": d.day, "pct": r * 100.0} for d, r in pairs]
+
+
+def py_moments(rets):
+    n = len(rets)
+    mean = sum(rets) / n
+    return (
+        mean, sum((r - mean) ** 2 for r in rets),
+        sum(1 for r in rets if r > 0), sum(1 for r in rets if r < 0),
+        max(range(n), key=lambda i: rets[i]), min(range(n), key=lambda i: rets[i]),
+    )
+
+
+def py_growth(rets):
+    growth = 1.0
+    for r in rets:
+        growth *= (1.0 + r)
+    return growth - 1.0
+
+
+def py_perf_stats(series_all, today):
+    """compute_perf_summary's statistics as the strategies engine computed them per run."""
+    data = py_parse(series_all)
+    rets = [r for _, r in data]
+    n = len(rets)
+    best_idx = max(range(n), key=lambda i: rets[i])
+    worst_idx = min(range(n), key=lambda i: rets[i])
+    ytd_start = dt.date(today.year, 1, 1)
+    growth = 1.0
+    for d, r in data:
+        if ytd_start <= d <= today:
+            growth *= (1.0 + r)
+    return (
+        rets[best_idx], rets[worst_idx],
+        sum(1 for r in rets if r > 0), sum(1 for r in rets if r < 0),
+        sum(rets) / n, statistics.pstdev(rets), growth - 1.0,
+        sorted(abs(r) * 100.0 for r in rets)[n // 2],
+    )
+
+
+def perf_stats(series_all, today, state=None):
+    """The same statistics through PerfAccumulator, as compute_perf_summary gets them."""
+    stats = PerfAccumulator.from_state(state).sync(series_all)
+    return stats.summary_fields(today), stats.stdev(ddof=0), stats.median_abs_pct()
+
+
+def py_values(rets, v=1000.0):
+    out = []
+    for r in rets:
+        v = v * (1.0 + r)
+        out.append(v)
+    return out
+
+
+def py_windows(series_all, today):
+    """build_window_series before series_windows.py: one ISO-string scan per window."""
+    out = {"series_1d": series_all[-1:]}
+    cutoffs = {name: today - dt.timedelta(days=days) for name, days in STRATEGY_WINDOW_DAYS.items()}
+    cutoffs["series_ytd"] = dt.date(today.year, 1, 1)
+    for name, cutoff in cutoffs.items():
+        cutoff_str = cutoff.isoformat()
+        out[name] = [e for e in series_all if e.get("date", "") >= cutoff_str]
+    return out
+
+
+# ================ MAIN ===================
+
+if __name__ == "__main__":
+    series_all = make_series(SERIES_DAYS)
+    today = dt.date.today()
+    pairs = py_parse(series_all)
+    rets = [r for _, r in pairs]
+    daily = parse_daily_returns(series_all)
+
+    # state as persisted in strategy_metrics.perf_state by the previous run,
+    # which had every day but today's
+    previous = PerfAccumulator()
+    previous.sync(series_all[:-1])
+    previous_state = json.loads(json.dumps(previous.to_state()))
+
+    cases = [
+        ("parse series_all", lambda: py_parse(series_all), lambda: parse_daily_returns(series_all)),
+        ("calendar_returns", lambda: py_calendar(pairs), lambda: calendar_rows(daily, PERCENT)),
+        ("perf stats, cold", lambda: py_perf_stats(series_all, today), lambda: perf_stats(series_all, today)),
+        ("perf stats, resumed", lambda: py_perf_stats(series_all, today),
+         lambda: perf_stats(series_all, today, previous_state)),
+        ("moments", lambda: py_moments(rets), lambda: running_stats(daily.returns)),
+        ("compound growth", lambda: py_growth(rets), lambda: compound_growth(daily.returns)),
+        ("value path", lambda: py_values(rets), lambda: compound_values(1000.0, daily.returns)),
+        ("cumulative growth", lambda: [1.0] + py_values(rets, 1.0), lambda: cumulative_growth(daily.returns)),
+        ("window slicing", lambda: py_windows(series_all, today), lambda: slice_windows(series_all, today)),
+    ]
+
+    print(f"[BENCH] {SERIES_DAYS} points, best of {REPEATS} runs")
+    print(f"{'path':<22}{'python ms':>12}{'engine ms':>12}{'speedup':>10}")
+    for name, baseline, current in cases:
+        t_py = best_of(baseline)
+        t_np = best_of(current)
+        print(f"{name:<22}{t_py * 1000:>12.3f}{t_np * 1000:>12.3f}{t_py / t_np:>9.1f}x")
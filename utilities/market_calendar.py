@@ -0,0 +1,208 @@
+import datetime as dt
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
+from zoneinfo import ZoneInfo
+
+# ==========================
+# CONFIG
+# ==========================
+
+NY_TZ = ZoneInfo("America/New_York")
+
+SESSION_OPEN = dt.time(9, 30)
+SESSION_CLOSE = dt.time(16, 0)
+EARLY_CLOSE = dt.time(13, 0)
+
+# Settlement pass runs this long after the close so the final daily bar is published
+SETTLEMENT_DELAY_SECONDS = 20 * 60
+
+# Upper bound on a single idle sleep, so clock jumps / DST shifts are picked up
+MAX_IDLE_SLEEP_SECONDS = 60 * 60
+
+# One-off closures that don't follow the holiday rules (e.g. national days of mourning)
+SPECIAL_CLOSURES: Dict[dt.date, str] = {
+    dt.date(2025, 1, 9): "National Day of Mourning (Jimmy Carter)",
+}
+
+PHASE_INTRADAY = "intraday"
+PHASE_SETTLEMENT = "settlement"
+
+
+# ================ NYSE HOLIDAYS ===================
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> dt.date:
+    """n-th (1-based) weekday (Mon=0) of the month; n=-1 for the last one."""
+    if n > 0:
+        first = dt.date(year, month, 1)
+        offset = (weekday - first.weekday()) % 7
+        return first + dt.timedelta(days=offset + 7 * (n - 1))
+    next_month = dt.date(year + (month == 12), month % 12 + 1, 1)
+    last = next_month - dt.timedelta(days=1)
+    return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> dt.date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return dt.date(year, month, day + 1)
+
+
+def _observed(d: dt.date) -> dt.date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if d.weekday() == 5:
+        return d - dt.timedelta(days=1)
+    if d.weekday() == 6:
+        return d + dt.timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> Dict[dt.date, str]:
+    """Full-day NYSE closures for `year`, computed from the exchange's rules."""
+    holidays: Dict[dt.date, str] = {}
+
+    # New Year's Day: a Saturday holiday is NOT moved back into the prior year
+    new_year = dt.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+
+    holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - dt.timedelta(days=2)] = "Good Friday"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(dt.date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(dt.date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    holidays[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    holidays[_observed(dt.date(year, 12, 25))] = "Christmas Day"
+
+    for d, reason in SPECIAL_CLOSURES.items():
+        if d.year == year:
+            holidays[d] = reason
+
+    return holidays
+
+
+def is_trading_day(d: dt.date) -> bool:
+    return d.weekday() < 5 and d not in nyse_holidays(d.year)
+
+
+def is_early_close(d: dt.date) -> bool:
+    """1pm closes: July 3rd, the day after Thanksgiving and Christmas Eve, when they are trading days."""
+    if not is_trading_day(d):
+        return False
+    if (d.month, d.day) in ((7, 3), (12, 24)):
+        return True
+    return d == _nth_weekday(d.year, 11, 3, 4) + dt.timedelta(days=1)
+
+
+def session_bounds(d: dt.date) -> Tuple[dt.datetime, dt.datetime] | None:
+    """(open, close) for the trading day `d` as UTC datetimes, or None if the market is closed."""
+    if not is_trading_day(d):
+        return None
+    close_time = EARLY_CLOSE if is_early_close(d) else SESSION_CLOSE
+    open_dt = dt.datetime.combine(d, SESSION_OPEN, tzinfo=NY_TZ).astimezone(dt.timezone.utc)
+    close_dt = dt.datetime.combine(d, close_time, tzinfo=NY_TZ).astimezone(dt.timezone.utc)
+    return open_dt, close_dt
+
+
+def is_market_open(at: dt.datetime) -> bool:
+    bounds = session_bounds(at.astimezone(NY_TZ).date())
+    return bounds is not None and bounds[0] <= at < bounds[1]
+
+
+def next_session(after: dt.datetime) -> Tuple[dt.datetime, dt.datetime]:
+    """First session whose close is later than `after` (may already be in progress)."""
+    d = after.astimezone(NY_TZ).date()
+    while True:
+        bounds = session_bounds(d)
+        if bounds is not None and bounds[1] > after:
+            return bounds
+        d += dt.timedelta(days=1)
+
+
+def previous_session(before: dt.datetime) -> Tuple[dt.datetime, dt.datetime]:
+    """Most recent session that closed at or before `before`."""
+    d = before.astimezone(NY_TZ).date()
+    while True:
+        bounds = session_bounds(d)
+        if bounds is not None and bounds[1] <= before:
+            return bounds
+        d -= dt.timedelta(days=1)
+
+
+# ================ SCHEDULER ===================
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def run_market_scheduler(
+    job: Callable[[str], None],
+    name: str,
+    intraday_interval_seconds: int,
+    settlement_delay_seconds: int = SETTLEMENT_DELAY_SECONDS,
+) -> None:
+    """
+    Run `job(phase)` forever, following the NYSE session calendar:
+
+    - while the market is open: every `intraday_interval_seconds` with
+      phase=PHASE_INTRADAY
+    - once per session, `settlement_delay_seconds` after the close:
+      phase=PHASE_SETTLEMENT
+    - otherwise idle until the next of those events
+
+    On start-up outside the session a settlement pass runs immediately for
+    the most recent close, so a restarted engine never waits a weekend to
+    catch up. Exceptions from `job` are logged and the loop continues.
+    """
+
+    def run(phase: str) -> None:
+        print(f"\n[ENGINE] {name} {phase} run at {_now().isoformat()}")
+        try:
+            job(phase)
+        except Exception as e:
+            print(f"[ERROR] {name} run failed: {e}")
+
+    settled_close = None
+    if not is_market_open(_now()):
+        run(PHASE_SETTLEMENT)
+        last_close = previous_session(_now())[1]
+        # Only count it as that session's settlement once the final bar is published
+        if _now() >= last_close + dt.timedelta(seconds=settlement_delay_seconds):
+            settled_close = last_close
+
+    next_intraday = _now()
+
+    while True:
+        now = _now()
+        open_dt, close_dt = next_session(now)
+
+        if open_dt <= now < close_dt:
+            if now >= next_intraday:
+                run(PHASE_INTRADAY)
+                next_intraday = _now() + dt.timedelta(seconds=intraday_interval_seconds)
+            wake = min(next_intraday, close_dt)
+        else:
+            last_close = previous_session(now)[1]
+            settle_at = last_close + dt.timedelta(seconds=settlement_delay_seconds)
+            if settled_close != last_close and now >= settle_at:
+                run(PHASE_SETTLEMENT)
+                settled_close = last_close
+                continue
+            wake = settle_at if settled_close != last_close else open_dt
+            next_intraday = open_dt
+
+        sleep_for = (wake - _now()).total_seconds()
+        time.sleep(min(max(sleep_for, 1.0), MAX_IDLE_SLEEP_SECONDS))
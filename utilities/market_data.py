@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ==========================
+# CONFIG
+# ==========================
+
+ALPACA_DATA_URL = "https://data.alpaca.markets/v2"
+
+# Alpaca's basic market-data plan allows 200 requests per minute per key.
+DEFAULT_REQUESTS_PER_MINUTE = 200
+DEFAULT_BURST = 10
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 5
+
+# Alpaca caps a single /v2/stocks/bars page at 10,000 bars across all symbols.
+MAX_BARS_PER_PAGE = 10000
+
+
+# ================ RATE LIMITING ===================
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire()` blocks until a token is available,
+    refilling at `rate_per_minute` with at most `burst` tokens banked.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate_per_sec = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_sec)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate_per_sec
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the server answered 429."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+
+# ================ CLIENT ===================
+
+class AlpacaMarketDataClient:
+    """
+    Shared Alpaca market-data client.
+
+    - one keep-alive requests.Session with a pooled HTTPS adapter
+    - token-bucket rate limiting across all threads using the client
+    - safe_get() retry with exponential backoff (honours Retry-After on 429)
+    - get_bars() follows next_page_token so multi-symbol ranges are complete
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        secret_key: str,
+        data_url: str = ALPACA_DATA_URL,
+        feed: str = "iex",
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        burst: int = DEFAULT_BURST,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        self.data_url = data_url.rstrip("/")
+        self.feed = feed
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = TokenBucket(requests_per_minute, burst)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "accept": "application/json",
+            "APCA-API-KEY-ID": api_key,
+            "APCA-API-SECRET-KEY": secret_key,
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def safe_get(self, url: str, params: Dict[str, Any], retries: int | None = None) -> requests.Response:
+        """Rate-limited GET with retries + backoff."""
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries):
+            self.limiter.acquire()
+            wait = (2 ** attempt) + random.uniform(0, 1)
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                if resp.status_code == 429:
+                    self.limiter.drain()
+                    retry_after = resp.headers.get("Retry-After")
+                    if retry_after:
+                        try:
+                            wait = max(wait, float(retry_after))
+                        except ValueError:
+                            pass
+                resp.raise_for_status()
+                return resp
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                # Other client errors will not succeed on retry
+                if status is not None and 400 <= status < 500 and status not in (408, 429):
+                    raise RuntimeError(f"Alpaca request failed: {status} {e.response.text}") from e
+                print(f"[Retry {attempt+1}] Error: {e} — waiting {wait:.2f}s")
+            except Exception as e:
+                print(f"[Retry {attempt+1}] Error: {e} — waiting {wait:.2f}s")
+            time.sleep(wait)
+
+        raise RuntimeError("Max retries exceeded for Alpaca request")
+
+    def get_bars(
+        self,
+        symbols: Iterable[str],
+        timeframe: str,
+        start_iso: str,
+        end_iso: str,
+        limit: int = MAX_BARS_PER_PAGE,
+        adjustment: str = "raw",
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch bars for one or many symbols from /v2/stocks/bars, following
+        next_page_token until the range is exhausted. Request failures and
+        unreadable pages raise RuntimeError.
+
+        Returns:
+          dict: { symbol: [ {t, o, h, l, c, v, ...}, ... ] } (sorted oldest -> newest)
+        """
+        symbols = sorted({s for s in symbols if s})
+        if not symbols:
+            return {}
+
+        url = f"{self.data_url}/stocks/bars"
+        params: Dict[str, Any] = {
+            "symbols": ",".join(symbols),
+            "timeframe": timeframe,
+            "start": start_iso,
+            "end": end_iso,
+            "limit": limit,
+            "adjustment": adjustment,
+            "feed": self.feed,
+            "sort": "asc",
+        }
+
+        bars_by_symbol: Dict[str, List[Dict[str, Any]]] = {}
+
+        while True:
+            resp = self.safe_get(url, params=params)
+            try:
+                data = resp.json()
+            except ValueError as e:
+                # malformed or truncated body; callers only expect RuntimeError
+                raise RuntimeError(f"Alpaca returned an unreadable bars page: {e}") from e
+
+            page = data.get("bars") or {}
+            if isinstance(page, dict):
+                for sym, bar_list in page.items():
+                    if bar_list:
+                        bars_by_symbol.setdefault(sym, []).extend(bar_list)
+
+            page_token = data.get("next_page_token")
+            if not page_token:
+                break
+            params["page_token"] = page_token
+
+        for bar_list in bars_by_symbol.values():
+            bar_list.sort(key=lambda b: b.get("t") or "")
+
+        return bars_by_symbol
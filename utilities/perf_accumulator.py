@@ -0,0 +1,348 @@
+import datetime as dt
+import math
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from analytics import compound_growth, running_stats
+
+# ==========================
+# CONFIG
+# ==========================
+
+STATE_VERSION = 2
+
+# Trailing window kept for "typical day" style statistics
+TAIL_SIZE = 25
+
+# The median of |r| comes from a fixed-bin histogram of |r| in percent, so
+# the state stays bounded: at most MEDIAN_MAX_BINS bins of MEDIAN_BIN_PCT
+# each (|r| beyond the last bin is counted in it). median_abs_pct() returns
+# the centre of the bin holding the median, i.e. within MEDIAN_BIN_PCT / 2
+# of the exact value.
+MEDIAN_BIN_PCT = 0.01
+MEDIAN_MAX_BINS = 5000
+
+# Persisted state (stored in strategy_metrics.perf_state, which the
+# frontend never selects). Both engines write this one format, so either can
+# resume a state the other wrote for the same row:
+# {
+#   "version": 2,
+#   "sealed_through": "2024-06-03",  # last date folded into the state
+#   "sealed_value": 0.0012,          # its return, to detect a rewrite
+#   "sealed_points": 611,            # series_all position just after it
+#   "count", "mean", "m2", "total", "days_positive", "days_negative",
+#   "best": [r, date], "worst": [r, date],
+#   "ytd_year", "ytd_growth", "ytd_days",
+#   "tail": [...],                   # last TAIL_SIZE returns
+#   "abs_bins": [...], "abs_counts": [...]  # non-empty histogram bins
+# }
+
+
+def _parse_point(pt: Any) -> Tuple[dt.date, float] | None:
+    if not isinstance(pt, dict):
+        return None
+    d_str = pt.get("date")
+    pct = pt.get("pct")
+    if d_str is None or pct is None:
+        return None
+    try:
+        return dt.date.fromisoformat(d_str), float(pct)
+    except Exception:
+        return None
+
+
+def _abs_bin(r: float) -> int:
+    return min(int(abs(r) * 100.0 / MEDIAN_BIN_PCT), MEDIAN_MAX_BINS - 1)
+
+
+class PerfAccumulator:
+    """
+    Running perf_summary statistics over a date-sorted daily return series
+    (decimal returns): Welford mean/variance, running sum, positive/negative
+    counts, first-occurrence best/worst day, the current year's growth
+    factor, a bounded tail of recent returns and a histogram of absolute
+    returns for the median.
+
+    sync() folds every point except the last into the state ("sealed") and
+    keeps the last point open, because engines rewrite the latest day on
+    every cycle. A later sync() only parses the points after the sealed
+    position; if the point at that position no longer matches the sealed
+    date/value, history was rewritten and the state is rebuilt from scratch.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0.0
+        self.days_positive = 0
+        self.days_negative = 0
+        self.best: Tuple[float, str] | None = None
+        self.worst: Tuple[float, str] | None = None
+        self.ytd_year: int | None = None
+        self.ytd_growth = 1.0
+        self.ytd_days = 0
+        self.tail: deque = deque(maxlen=TAIL_SIZE)
+        self.abs_hist: Dict[int, int] = {}
+        self.open_abs: List[int] = []
+
+        self.sealed_through: str | None = None
+        self.sealed_value: float | None = None
+        self.sealed_points = 0
+        self.rebuilt = False
+
+    # ---------------- updates ----------------
+
+    def push(self, d: dt.date, r: float, seal: bool = True) -> None:
+        """Fold one day in; unsealed days keep their |r| out of abs_hist."""
+        self.count += 1
+        delta = r - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (r - self.mean)
+        self.total += r
+
+        if r > 0:
+            self.days_positive += 1
+        elif r < 0:
+            self.days_negative += 1
+
+        # strict comparisons keep the first occurrence, like max()/min() over indexes
+        if self.best is None or r > self.best[0]:
+            self.best = (r, d.isoformat())
+        if self.worst is None or r < self.worst[0]:
+            self.worst = (r, d.isoformat())
+
+        if d.year != self.ytd_year:
+            self.ytd_year = d.year
+            self.ytd_growth = 1.0
+            self.ytd_days = 0
+        self.ytd_growth *= (1.0 + r)
+        self.ytd_days += 1
+
+        self.tail.append(r)
+
+        b = _abs_bin(r)
+        if seal:
+            self.abs_hist[b] = self.abs_hist.get(b, 0) + 1
+        else:
+            self.open_abs.append(b)
+
+    def _prefix_intact(self, series_all: List[Dict[str, Any]]) -> bool:
+        if self.sealed_points == 0:
+            return self.count == 0
+        if self.sealed_points > len(series_all):
+            return False
+        parsed = _parse_point(series_all[self.sealed_points - 1])
+        return (
+            parsed is not None
+            and parsed[0].isoformat() == self.sealed_through
+            and parsed[1] == self.sealed_value
+        )
+
+    def sync(self, series_all: List[Dict[str, Any]]) -> "PerfAccumulator":
+        """
+        Bring the sealed state up to date with `series_all` (sorted by date)
+        and return a view that also includes the open last point. Cost is
+        O(points since the previous sync) unless history was rewritten.
+        """
+        self.rebuilt = not self._prefix_intact(series_all)
+        if self.rebuilt:
+            self.reset()
+            self.rebuilt = True
+
+        seal_until = max(len(series_all) - 1, self.sealed_points)
+        if self.count == 0:
+            self._seed(series_all, seal_until)
+
+        for i in range(self.sealed_points, seal_until):
+            parsed = _parse_point(series_all[i])
+            if parsed is None:
+                continue
+            self.push(*parsed)
+            self.sealed_through = parsed[0].isoformat()
+            self.sealed_value = parsed[1]
+            self.sealed_points = i + 1
+
+        view = self._copy()
+        for pt in series_all[seal_until:]:
+            parsed = _parse_point(pt)
+            if parsed is not None:
+                view.push(*parsed, seal=False)
+        return view
+
+    def _seed(self, series_all: List[Dict[str, Any]], seal_until: int) -> None:
+        """Seal series_all[:seal_until] into an empty state with the vectorised kernels."""
+        dates: List[dt.date] = []
+        rets: List[float] = []
+        last_pos = 0
+        for i in range(seal_until):
+            parsed = _parse_point(series_all[i])
+            if parsed is None:
+                continue
+            dates.append(parsed[0])
+            rets.append(parsed[1])
+            last_pos = i + 1
+
+        if not rets:
+            return
+
+        arr = np.asarray(rets, dtype=np.float64)
+        stats = running_stats(arr)
+        self.count = stats["count"]
+        self.mean = stats["mean"]
+        self.m2 = stats["m2"]
+        self.total = stats["total"]
+        self.days_positive = stats["days_positive"]
+        self.days_negative = stats["days_negative"]
+        self.best = (rets[stats["best_idx"]], dates[stats["best_idx"]].isoformat())
+        self.worst = (rets[stats["worst_idx"]], dates[stats["worst_idx"]].isoformat())
+
+        self.ytd_year = dates[-1].year
+        year_start = bisect_left(dates, dt.date(self.ytd_year, 1, 1))
+        self.ytd_growth = compound_growth(arr[year_start:]) + 1.0
+        self.ytd_days = len(arr) - year_start
+
+        self.tail = deque(rets[-TAIL_SIZE:], maxlen=TAIL_SIZE)
+        bins = np.minimum((np.abs(arr) * 100.0 / MEDIAN_BIN_PCT).astype(np.int64), MEDIAN_MAX_BINS - 1)
+        values, counts = np.unique(bins, return_counts=True)
+        self.abs_hist = dict(zip(values.tolist(), counts.tolist()))
+
+        self.sealed_through = dates[-1].isoformat()
+        self.sealed_value = rets[-1]
+        self.sealed_points = last_pos
+
+    def _copy(self) -> "PerfAccumulator":
+        other = PerfAccumulator.__new__(PerfAccumulator)
+        other.__dict__.update(self.__dict__)
+        other.tail = deque(self.tail, maxlen=TAIL_SIZE)
+        # abs_hist is shared read-only; the view only appends to open_abs
+        other.open_abs = list(self.open_abs)
+        return other
+
+    # ---------------- statistics ----------------
+
+    def variance(self, ddof: int) -> float:
+        """m2 / (count - ddof): ddof=0 population, ddof=1 sample; 0.0 under two days."""
+        n = self.count - ddof
+        if self.count < 2 or n <= 0:
+            return 0.0
+        return max(self.m2 / n, 0.0)
+
+    def stdev(self, ddof: int) -> float:
+        return math.sqrt(self.variance(ddof))
+
+    def ytd_return(self, year: int) -> float:
+        """Compounded return of `year` (decimal), 0.0 if it has no days."""
+        if self.ytd_year != year or self.ytd_days == 0:
+            return 0.0
+        return self.ytd_growth - 1.0
+
+    def mean_abs_tail_pct(self, k: int) -> float:
+        """Mean of |r| * 100 over the last k days (at most TAIL_SIZE)."""
+        tail = list(self.tail)[-k:]
+        if not tail:
+            return 0.0
+        return sum(abs(r) for r in tail) / len(tail) * 100.0
+
+    def summary_fields(self, today: dt.date) -> Dict[str, Any]:
+        """
+        The perf_summary fields both engines report identically (*_pct in
+        percent); each engine adds its own risk and stability fields.
+        """
+        return {
+            "total_days": self.count,
+            "best_day_pct": self.best[0] * 100.0,
+            "best_day_date": self.best[1],
+            "worst_day_pct": self.worst[0] * 100.0,
+            "worst_day_date": self.worst[1],
+            "days_positive": self.days_positive,
+            "days_negative": self.days_negative,
+            "positive_days_pct": self.days_positive / self.count * 100.0,
+            "negative_days_pct": self.days_negative / self.count * 100.0,
+            "avg_daily_return_pct": self.total / self.count * 100.0,
+            "ytd_return_pct": self.ytd_return(today.year) * 100.0,
+        }
+
+    def median_abs_pct(self) -> float:
+        """sorted(|r| * 100)[n // 2] over all days, sealed and open, to the histogram's resolution."""
+        if self.count == 0:
+            return 0.0
+        hist = self.abs_hist
+        if self.open_abs:
+            hist = dict(hist)
+            for b in self.open_abs:
+                hist[b] = hist.get(b, 0) + 1
+
+        k = self.count // 2
+        seen = 0
+        for b in sorted(hist):
+            seen += hist[b]
+            if seen > k:
+                return (b + 0.5) * MEDIAN_BIN_PCT
+        return 0.0
+
+    # ---------------- persistence ----------------
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "version": STATE_VERSION,
+            "sealed_through": self.sealed_through,
+            "sealed_value": self.sealed_value,
+            "sealed_points": self.sealed_points,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "total": self.total,
+            "days_positive": self.days_positive,
+            "days_negative": self.days_negative,
+            "best": list(self.best) if self.best else None,
+            "worst": list(self.worst) if self.worst else None,
+            "ytd_year": self.ytd_year,
+            "ytd_growth": self.ytd_growth,
+            "ytd_days": self.ytd_days,
+            "tail": list(self.tail),
+            "abs_bins": sorted(self.abs_hist),
+            "abs_counts": [self.abs_hist[b] for b in sorted(self.abs_hist)],
+        }
+
+    @classmethod
+    def from_state(cls, state: Any) -> "PerfAccumulator":
+        """Restore a persisted state; anything unusable yields an empty accumulator."""
+        acc = cls()
+        if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+            return acc
+
+        try:
+            abs_bins = state.get("abs_bins")
+            abs_counts = state.get("abs_counts")
+            if not (isinstance(abs_bins, list) and isinstance(abs_counts, list)):
+                return acc
+
+            acc.sealed_through = state.get("sealed_through")
+            acc.sealed_value = state.get("sealed_value")
+            acc.sealed_points = int(state["sealed_points"])
+            acc.count = int(state["count"])
+            acc.mean = float(state["mean"])
+            acc.m2 = float(state["m2"])
+            acc.total = float(state["total"])
+            acc.days_positive = int(state["days_positive"])
+            acc.days_negative = int(state["days_negative"])
+            acc.best = (float(state["best"][0]), state["best"][1]) if state.get("best") else None
+            acc.worst = (float(state["worst"][0]), state["worst"][1]) if state.get("worst") else None
+            acc.ytd_year = state.get("ytd_year")
+            acc.ytd_growth = float(state["ytd_growth"])
+            acc.ytd_days = int(state["ytd_days"])
+            acc.tail = deque((float(r) for r in state.get("tail") or []), maxlen=TAIL_SIZE)
+            acc.abs_hist = {int(b): int(c) for b, c in zip(abs_bins, abs_counts)}
+            if len(abs_bins) != len(abs_counts) or sum(acc.abs_hist.values()) != acc.count:
+                return cls()
+        except (KeyError, TypeError, ValueError, IndexError):
+            return cls()
+
+        return acc
@@ -0,0 +1,75 @@
+import datetime as dt
+from typing import Callable, Set
+
+from market_calendar import run_market_scheduler
+
+import update_demo_accounts
+import update_strategies_engine
+import update_universe_data
+
+# ==========================
+# CONFIG
+# ==========================
+
+# One pipeline pass per interval while the NYSE session is open. Each stage
+# starts as soon as the previous one finishes, so a price change reaches
+# demo_allocations within one pass instead of after three independent
+# sleep loops.
+INTRADAY_INTERVAL_SECONDS = update_universe_data.INTRADAY_INTERVAL_SECONDS
+
+
+def now_utc() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+# ================ STAGES ===================
+
+def _run_stage(name: str, stage: Callable[[], Set[str]]) -> Set[str] | None:
+    """
+    Run one stage and return the keys it changed. A failed stage returns
+    None, which tells the next stage to fall back to its own change
+    detection instead of trusting an incomplete key set.
+    """
+    started = now_utc()
+    try:
+        changed = stage()
+    except Exception as e:
+        print(f"[ERROR] Pipeline stage {name} failed: {e}")
+        return None
+
+    elapsed = (now_utc() - started).total_seconds()
+    print(f"[PIPELINE] {name}: {len(changed)} changed in {elapsed:.1f}s")
+    return changed
+
+
+def run_pipeline_cycle(phase: str) -> None:
+    """
+    trading_universe -> strategy_metrics -> demo_allocations, each stage
+    receiving only the keys the previous stage changed.
+    """
+    started = now_utc()
+
+    changed_symbols = _run_stage(
+        "universe",
+        lambda: update_universe_data.run_scheduled_cycle(phase),
+    )
+    changed_strategies = _run_stage(
+        "strategies",
+        lambda: update_strategies_engine.update_strategy_metrics_from_universe(changed_symbols=changed_symbols),
+    )
+    _run_stage(
+        "demo allocations",
+        lambda: update_demo_accounts.update_demo_allocations_from_strategies(changed_strategies=changed_strategies),
+    )
+
+    print(f"[PIPELINE] {phase} pass finished in {(now_utc() - started).total_seconds():.1f}s")
+
+
+# ================ SCHEDULER LOOP ===================
+
+if __name__ == "__main__":
+    print(
+        "[ENGINE] Pipeline started (universe -> strategies -> demo allocations) — every "
+        f"{INTRADAY_INTERVAL_SECONDS // 60} minutes during the NYSE session, plus a post-close settlement pass."
+    )
+    run_market_scheduler(run_pipeline_cycle, "Pipeline", INTRADAY_INTERVAL_SECONDS)
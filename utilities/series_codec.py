@@ -0,0 +1,130 @@
+import datetime as dt
+import os
+from typing import Any, Dict, List
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Compatibility flag: while the frontend still reads the legacy
+# list-of-dicts layout, engines keep writing it. Readers always accept both.
+COMPACT_SERIES_ENABLED = os.environ.get("ALGOHIVE_COMPACT_SERIES", "0") == "1"
+
+COMPACT_FORMAT = "compact-v1"
+
+_EPOCH_MINUTE_BASE = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+
+# Compact layout:
+# {
+#   "format": "compact-v1",
+#   "unit": "day" | "minute",
+#   "start": "2024-01-02" | "2024-01-02T14:30:00Z",
+#   "date_key": "date",        # key the legacy points used for the timestamp
+#   "value_key": "pct",        # key the legacy points used for the value
+#   "offsets": [0, 1, 2, 5, ...],   # days / minutes after start, ascending
+#   "values":  [0.0012, -0.003, ...]
+# }
+
+
+def is_compact(obj: Any) -> bool:
+    return isinstance(obj, dict) and obj.get("format") == COMPACT_FORMAT
+
+
+def _parse_minute(ts: str) -> dt.datetime:
+    t = dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.timezone.utc)
+    return t
+
+
+def _format_minute(t: dt.datetime) -> str:
+    return t.astimezone(dt.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def encode_series(points: List[Dict[str, Any]], value_key: str = "pct", date_key: str = "date") -> Dict[str, Any]:
+    """
+    Encode [{date_key: ..., value_key: ...}, ...] as a start date plus
+    parallel arrays of offsets and values. Points with a missing or
+    unparseable timestamp/value are dropped; output is sorted by time.
+    Timestamps longer than a plain date are encoded in minute units.
+    """
+    pairs = []
+    for pt in points or []:
+        if not isinstance(pt, dict):
+            continue
+        stamp = pt.get(date_key)
+        value = pt.get(value_key)
+        if not stamp or value is None:
+            continue
+        pairs.append((str(stamp), value))
+
+    unit = "minute" if any(len(s) > 10 for s, _ in pairs) else "day"
+    encoded: Dict[str, Any] = {
+        "format": COMPACT_FORMAT,
+        "unit": unit,
+        "start": None,
+        "date_key": date_key,
+        "value_key": value_key,
+        "offsets": [],
+        "values": [],
+    }
+
+    keyed = []
+    for stamp, value in pairs:
+        try:
+            if unit == "day":
+                k = dt.date.fromisoformat(stamp[:10]).toordinal()
+            else:
+                k = int((_parse_minute(stamp) - _EPOCH_MINUTE_BASE).total_seconds()) // 60
+            keyed.append((k, float(value)))
+        except (TypeError, ValueError):
+            continue
+
+    if not keyed:
+        return encoded
+
+    keyed.sort(key=lambda kv: kv[0])
+    base = keyed[0][0]
+
+    if unit == "day":
+        encoded["start"] = dt.date.fromordinal(base).isoformat()
+    else:
+        encoded["start"] = _format_minute(_EPOCH_MINUTE_BASE + dt.timedelta(minutes=base))
+
+    encoded["offsets"] = [k - base for k, _ in keyed]
+    encoded["values"] = [v for _, v in keyed]
+    return encoded
+
+
+def decode_series(obj: Any) -> List[Dict[str, Any]]:
+    """
+    Return the legacy list-of-dicts layout for either storage format.
+    Legacy lists are passed through unchanged; anything else decodes to [].
+    """
+    if isinstance(obj, list):
+        return obj
+    if not is_compact(obj) or not obj.get("start"):
+        return []
+
+    date_key = obj.get("date_key") or "date"
+    value_key = obj.get("value_key") or "pct"
+    offsets = obj.get("offsets") or []
+    values = obj.get("values") or []
+
+    out: List[Dict[str, Any]] = []
+    if obj.get("unit") == "minute":
+        start = _parse_minute(obj["start"])
+        for off, v in zip(offsets, values):
+            out.append({date_key: _format_minute(start + dt.timedelta(minutes=off)), value_key: v})
+    else:
+        start_ord = dt.date.fromisoformat(obj["start"]).toordinal()
+        for off, v in zip(offsets, values):
+            out.append({date_key: dt.date.fromordinal(start_ord + off).isoformat(), value_key: v})
+    return out
+
+
+def encode_for_storage(points: List[Dict[str, Any]], value_key: str = "pct", date_key: str = "date") -> Any:
+    """Encode when COMPACT_SERIES_ENABLED, otherwise return the legacy list untouched."""
+    if not COMPACT_SERIES_ENABLED:
+        return points
+    return encode_series(points, value_key=value_key, date_key=date_key)
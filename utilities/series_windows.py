@@ -0,0 +1,167 @@
+import datetime as dt
+import os
+from bisect import bisect_left
+from typing import Any, Dict, List
+
+from series_codec import decode_series, encode_for_storage
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Storage mode: with ALGOHIVE_WINDOW_INDEX=1 engines write series_all once
+# plus a small `series_windows` index (jsonb column on strategy_metrics and
+# demo_allocations) and store null in series_1m..series_ytd instead of six
+# overlapping copies. Off until the frontend reads the index; readers in
+# this directory accept both layouts through decode_window_columns().
+WINDOW_INDEX_ENABLED = os.environ.get("ALGOHIVE_WINDOW_INDEX", "0") == "1"
+
+WINDOW_INDEX_FORMAT = "window-index-v1"
+
+WINDOW_COLUMNS = ("series_1m", "series_3m", "series_6m", "series_1y", "series_3y", "series_ytd")
+
+# Window index layout:
+# {
+#   "format": "window-index-v1",
+#   "length": 781,                                  # len(series_all) when written
+#   "offsets": {"series_1m": 760, ...},             # window == series_all[offset:]
+#   "dates": {"series_1m": "2024-05-04", ...}       # first date of each window, null if empty
+# }
+
+# Look-back lengths in days per window; series_ytd is always Jan 1 of `today`.
+STRATEGY_WINDOW_DAYS: Dict[str, int] = {
+    "series_1m": 30,
+    "series_3m": 90,
+    "series_6m": 180,
+    "series_1y": 365,
+    "series_3y": 3 * 365,
+}
+
+# alpaca_metrics.py has always used slightly longer calendar windows
+ALPACA_WINDOW_DAYS: Dict[str, int] = {
+    "series_1m": 31,
+    "series_3m": 93,
+    "series_6m": 186,
+    "series_1y": 365,
+    "series_3y": 365 * 3,
+}
+
+
+def window_start_dates(today: dt.date, window_days: Dict[str, int] = STRATEGY_WINDOW_DAYS) -> Dict[str, dt.date]:
+    """First date (inclusive) of every window, including series_ytd."""
+    starts = {name: today - dt.timedelta(days=days) for name, days in window_days.items()}
+    starts["series_ytd"] = dt.date(today.year, 1, 1)
+    return starts
+
+
+def series_offset(series_all: List[Dict[str, Any]], start: dt.date, date_key: str = "date") -> int:
+    """
+    Index of the first point dated on/after `start` in a series sorted by
+    its ISO date strings; series_all[offset:] is the window. O(log n).
+    """
+    return bisect_left(series_all, start.isoformat(), key=lambda e: e.get(date_key, ""))
+
+
+def window_offsets(
+    series_all: List[Dict[str, Any]],
+    today: dt.date,
+    window_days: Dict[str, int] = STRATEGY_WINDOW_DAYS,
+    date_key: str = "date",
+) -> Dict[str, int]:
+    """{window name: start offset into series_all} for every window."""
+    return {
+        name: series_offset(series_all, start, date_key)
+        for name, start in window_start_dates(today, window_days).items()
+    }
+
+
+def slice_windows(
+    series_all: List[Dict[str, Any]],
+    today: dt.date,
+    window_days: Dict[str, int] = STRATEGY_WINDOW_DAYS,
+    include_1d: bool = True,
+    date_key: str = "date",
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Slice every window out of a date-sorted series with one binary search
+    per window. With include_1d, series_1d is the last point.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    if include_1d:
+        out["series_1d"] = series_all[-1:]
+    for name, offset in window_offsets(series_all, today, window_days, date_key).items():
+        out[name] = series_all[offset:]
+    return out
+
+
+# ================ WINDOW INDEX ===================
+
+def is_window_index(obj: Any) -> bool:
+    return isinstance(obj, dict) and obj.get("format") == WINDOW_INDEX_FORMAT
+
+
+def build_window_index(
+    series_all: List[Dict[str, Any]],
+    windows: Dict[str, List[Dict[str, Any]]],
+    date_key: str = "date",
+) -> Dict[str, Any]:
+    """Index of the series_1m..series_ytd suffixes of series_all in `windows`."""
+    offsets = {name: len(series_all) - len(windows[name]) for name in WINDOW_COLUMNS}
+    return {
+        "format": WINDOW_INDEX_FORMAT,
+        "length": len(series_all),
+        "offsets": offsets,
+        "dates": {
+            name: series_all[offset].get(date_key) if offset < len(series_all) else None
+            for name, offset in offsets.items()
+        },
+    }
+
+
+def decode_windows(
+    series_all: List[Dict[str, Any]],
+    window_index: Dict[str, Any],
+    date_key: str = "date",
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Legacy {series_1m: [...], ...} from a decoded series_all and its index.
+    If series_all was rewritten to a different length since the index was
+    written, windows start at the indexed first dates instead.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    same_length = window_index.get("length") == len(series_all)
+    for name in WINDOW_COLUMNS:
+        offset = (window_index.get("offsets") or {}).get(name)
+        if not same_length or offset is None:
+            first = (window_index.get("dates") or {}).get(name)
+            offset = len(series_all) if first is None else series_offset(series_all, dt.date.fromisoformat(first), date_key)
+        out[name] = series_all[offset:]
+    return out
+
+
+def window_columns(
+    series_all: List[Dict[str, Any]],
+    windows: Dict[str, List[Dict[str, Any]]],
+    value_key: str = "pct",
+    date_key: str = "date",
+) -> Dict[str, Any]:
+    """
+    series_1m..series_ytd payload columns in the configured storage mode:
+    encoded copies, or null plus a series_windows index.
+    """
+    if not WINDOW_INDEX_ENABLED:
+        return {
+            name: encode_for_storage(windows[name], value_key=value_key, date_key=date_key)
+            for name in WINDOW_COLUMNS
+        }
+
+    columns: Dict[str, Any] = {name: None for name in WINDOW_COLUMNS}
+    columns["series_windows"] = build_window_index(series_all, windows, date_key)
+    return columns
+
+
+def decode_window_columns(row: Dict[str, Any], date_key: str = "date") -> Dict[str, List[Dict[str, Any]]]:
+    """series_1m..series_ytd of a stored row in the legacy layout, whichever mode wrote it."""
+    if is_window_index(row.get("series_windows")):
+        return decode_windows(decode_series(row.get("series_all")), row["series_windows"], date_key)
+    return {name: decode_series(row.get(name)) for name in WINDOW_COLUMNS}
@@ -0,0 +1,57 @@
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from supabase import Client
+
+# PostgREST caps a single response at its max-rows setting (1000 by default),
+# so pages must stay at or below that.
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_pages(
+    client: Client,
+    table: str,
+    columns: str,
+    key: str = "id",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    filters: Sequence[Tuple[str, str, Any]] = (),
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Page through `table` by keyset pagination on the unique column `key`,
+    selecting only `columns`. Yields one list of rows per page, so at most
+    `page_size` rows are held at a time regardless of table size.
+
+    `filters` are (operator, column, value) tuples applied to every page,
+    e.g. [("eq", "data_source", "Alpaca")].
+    """
+    selected = [c.strip() for c in columns.split(",")]
+    if "*" not in selected and key not in selected:
+        columns = f"{columns}, {key}"
+
+    last_key = None
+    while True:
+        query = client.table(table).select(columns)
+        for op, column, value in filters:
+            query = getattr(query, op)(column, value)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+
+        rows = query.order(key).limit(page_size).execute().data or []
+        if rows:
+            yield rows
+
+        if len(rows) < page_size:
+            return
+        last_key = rows[-1][key]
+
+
+def iter_rows(
+    client: Client,
+    table: str,
+    columns: str,
+    key: str = "id",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    filters: Sequence[Tuple[str, str, Any]] = (),
+) -> Iterator[Dict[str, Any]]:
+    """Row-at-a-time view of iter_pages()."""
+    for page in iter_pages(client, table, columns, key=key, page_size=page_size, filters=filters):
+        yield from page
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+from supabase import Client
+
+DEFAULT_BATCH_SIZE = 200
+
+
+class FieldFingerprints:
+    """
+    Digest of every column of a table as last written (or read) per row,
+    kept for the life of the process.
+
+    diff() strips a payload down to its key plus the columns whose digest
+    changed; touch columns (e.g. updated_at) ride along only when some other
+    column changed, and a payload with nothing else left is dropped.
+    seed() records values read from the table, so the first write after a
+    restart and rows changed by other writers are diffed against what is
+    actually stored. Digests of sent columns are committed only once the
+    write succeeded, so a failed row is resent in full next time.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, touch_columns: Iterable[str] = ()):
+        self.touch_columns = frozenset(touch_columns)
+        self.digests: Dict[Any, Dict[str, str]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(value: Any) -> str:
+        encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode()
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def seed(self, key_value: Any, row: Dict[str, Any], key: str) -> None:
+        digests = {col: self.digest(v) for col, v in row.items() if col != key}
+        with self.lock:
+            self.digests.setdefault(key_value, {}).update(digests)
+
+    def diff(
+        self, payload: Dict[str, Any], key: str, keep: Iterable[str] = ()
+    ) -> Tuple[Dict[str, Any] | None, Dict[str, str]]:
+        """
+        (payload with only changed columns or None if nothing changed, digests
+        to commit). Columns in `keep` are sent whenever the row is written.
+        """
+        key_value = payload[key]
+        with self.lock:
+            known = dict(self.digests.get(key_value) or {})
+
+        changed: Dict[str, Any] = {key: key_value}
+        digests: Dict[str, str] = {}
+        for col, value in payload.items():
+            if col == key or col in self.touch_columns:
+                continue
+            d = self.digest(value)
+            if known.get(col) != d:
+                changed[col] = value
+                digests[col] = d
+
+        if not digests:
+            return None, {}
+
+        for col in (*self.touch_columns, *keep):
+            if col in payload:
+                changed[col] = payload[col]
+        return changed, digests
+
+    def commit(self, key_value: Any, digests: Dict[str, str]) -> None:
+        with self.lock:
+            self.digests.setdefault(key_value, {}).update(digests)
+
+
+class BulkUpsertWriter:
+    """
+    Accumulate row payloads for one table and flush them as chunked bulk
+    upserts keyed on `key` (the table's primary/unique key).
+
+    Every payload must contain `key` and `required_columns`: the upsert's
+    INSERT half is checked even when the row exists, so any NOT NULL column
+    without a default has to travel with every payload. Payloads are
+    grouped by column set before sending, since PostgREST expects uniform
+    columns in a bulk body.
+    If a chunk is rejected, its rows are retried one by one as plain
+    `update().eq(key, ...)` calls so a single bad row cannot sink the whole
+    chunk; rows that still fail are recorded in `failures`.
+
+    With `fingerprints`, only the columns that changed since the row was
+    last written are sent (see FieldFingerprints); unchanged rows are
+    counted in `unchanged` and not sent at all.
+
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        table: str,
+        key: str = "id",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        fingerprints: FieldFingerprints | None = None,
+        required_columns: Iterable[str] = (),
+    ):
+        self.client = client
+        self.table = table
+        self.key = key
+        self.batch_size = max(1, batch_size)
+        self.fingerprints = fingerprints
+        self.required_columns = tuple(required_columns)
+
+        self.pending: List[Dict[str, Any]] = []
+        self.pending_digests: Dict[Any, Dict[str, str]] = {}
+        self.failures: List[Tuple[Any, str]] = []
+        self.written = 0
+        self.unchanged = 0
+        self.columns_skipped = 0
+        self.fallback_chunks = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "BulkUpsertWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
+
+    def add(self, payload: Dict[str, Any]) -> bool:
+        """Queue a payload; False if fingerprints found nothing to write."""
+        if payload.get(self.key) is None:
+            raise ValueError(f"{self.table} payload is missing key column '{self.key}'")
+        missing = [col for col in self.required_columns if col not in payload]
+        if missing:
+            raise ValueError(f"{self.table} payload is missing required columns {missing}")
+
+        digests: Dict[str, str] = {}
+        if self.fingerprints is not None:
+            full_width = len(payload)
+            payload, digests = self.fingerprints.diff(payload, self.key, keep=self.required_columns)
+            if payload is None:
+                with self.lock:
+                    self.unchanged += 1
+                return False
+            with self.lock:
+                self.columns_skipped += full_width - len(payload)
+
+        with self.lock:
+            if digests:
+                self.pending_digests[payload[self.key]] = digests
+            self.pending.append(payload)
+            if len(self.pending) < self.batch_size:
+                return True
+            batch, self.pending = self.pending, []
+
+        self._send(batch)
+        return True
+
+    def flush(self) -> None:
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self._send(batch)
+
+    def report(self) -> None:
+        """Print a one-line summary plus any per-row failures."""
+        print(f"[INFO] {self.table}: {self.written} rows written, {len(self.failures)} failed")
+        if self.fallback_chunks:
+            print(
+                f"[WARN] {self.table}: {self.fallback_chunks} bulk upserts were rejected and retried row by row; "
+                f"check the on_conflict key '{self.key}' has a unique constraint and required_columns covers "
+                "every NOT NULL column"
+            )
+        if self.fingerprints is not None:
+            print(f"[INFO] {self.table}: {self.unchanged} rows unchanged, {self.columns_skipped} unchanged columns not sent")
+        for key_value, error in self.failures:
+            print(f"[WARN] {self.table} {self.key}={key_value} failed to write: {error}")
+
+    # ---------------- internals ----------------
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for payload in batch:
+            groups.setdefault(tuple(sorted(payload.keys())), []).append(payload)
+
+        for rows in groups.values():
+            for i in range(0, len(rows), self.batch_size):
+                self._send_chunk(rows[i:i + self.batch_size])
+
+    def _send_chunk(self, chunk: List[Dict[str, Any]]) -> None:
+        try:
+            self.client.table(self.table).upsert(chunk, on_conflict=self.key).execute()
+            with self.lock:
+                self.written += len(chunk)
+            for payload in chunk:
+                self._commit(payload[self.key])
+            return
+        except Exception as e:
+            with self.lock:
+                self.fallback_chunks += 1
+            print(
+                f"[WARN] Bulk upsert of {len(chunk)} {self.table} rows failed, retrying as "
+                f"{len(chunk)} single-row updates: {e}"
+            )
+
+        for payload in chunk:
+            key_value = payload[self.key]
+            update = {k: v for k, v in payload.items() if k != self.key}
+            try:
+                self.client.table(self.table).update(update).eq(self.key, key_value).execute()
+                with self.lock:
+                    self.written += 1
+                self._commit(key_value)
+            except Exception as e:
+                with self.lock:
+                    self.failures.append((key_value, str(e)))
+                    self.pending_digests.pop(key_value, None)
+
+    def _commit(self, key_value: Any) -> None:
+        with self.lock:
+            digests = self.pending_digests.pop(key_value, None)
+        if digests and self.fingerprints is not None:
+            self.fingerprints.commit(key_value, digests)
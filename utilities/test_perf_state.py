@@ -0,0 +1,55 @@
+import datetime as dt
+import json
+import random
+
+import pytest
+
+pytest.importorskip("supabase")
+
+import alpaca_metrics  # noqa: E402
+import perf_accumulator  # noqa: E402
+import update_strategies_engine  # noqa: E402
+
+
+def make_series(days: int, seed: int = 2):
+    rng = random.Random(seed)
+    start = dt.date(2024, 3, 1)
+    return [
+        {"date": (start + dt.timedelta(days=i)).isoformat(), "pct": rng.gauss(0.0, 0.01)}
+        for i in range(days)
+    ]
+
+
+def assert_close(a, b):
+    assert a.keys() == b.keys()
+    for k in a:
+        if isinstance(a[k], dict):
+            assert_close(a[k], b[k])
+        elif isinstance(a[k], float):
+            assert a[k] == pytest.approx(b[k], rel=1e-9, abs=1e-12), k
+        else:
+            assert a[k] == b[k], k
+
+
+def test_perf_state_round_trips_between_engines(monkeypatch):
+    seeds = []
+    seed = perf_accumulator.PerfAccumulator._seed
+    monkeypatch.setattr(
+        perf_accumulator.PerfAccumulator, "_seed",
+        lambda self, *args: seeds.append(1) or seed(self, *args),
+    )
+    series = make_series(400)
+
+    # alpaca_metrics writes first; the strategies engine resumes its state
+    _, alpaca_state = alpaca_metrics.build_perf_summary(series[:-5])
+    alpaca_state = json.loads(json.dumps(alpaca_state))
+    summary, engine_state = update_strategies_engine.compute_perf_summary(series[:-2], alpaca_state)
+    assert len(seeds) == 1
+
+    # ... and the other way round
+    engine_state = json.loads(json.dumps(engine_state))
+    alpaca_summary, _ = alpaca_metrics.build_perf_summary(series, engine_state)
+    assert len(seeds) == 1
+
+    assert_close(summary, update_strategies_engine.compute_perf_summary(series[:-2])[0])
+    assert_close(alpaca_summary, alpaca_metrics.build_perf_summary(series)[0])
@@ -1,9 +1,19 @@
 import os
-import time
 import datetime as dt
-from typing import Dict, List, Any, Tuple
+import hashlib
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, List, Any, Set, Tuple
+import numpy as np
 from supabase import create_client, Client
 
+from analytics import DailyReturns, compound_values, cumulative_growth, parse_daily_returns
+from market_calendar import run_market_scheduler
+from series_codec import decode_series, encode_for_storage
+from series_windows import STRATEGY_WINDOW_DAYS, slice_windows, window_columns
+from supabase_reader import iter_rows
+from supabase_writer import BulkUpsertWriter
+
 # ==========================
 # CONFIG
 # ==========================
@@ -13,6 +23,37 @@ SUPABASE_SERVICE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmF
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+# demo_allocations payloads are flushed as bulk upserts of this size
+WRITE_BATCH_SIZE = 500
+
+# Tables are streamed in pages of this many rows (see supabase_reader.py)
+READ_PAGE_SIZE = 500
+STRATEGY_READ_PAGE_SIZE = 100
+
+# Refresh cadence while the NYSE session is open (see market_calendar.py)
+INTRADAY_INTERVAL_SECONDS = 600
+
+# Columns copied from the source row into each upsert so the insert half of
+# the upsert satisfies the table's NOT NULL constraints.
+ALLOCATION_IDENTITY_COLUMNS = ("id", "demo_profile_id", "strategy_id", "amount_invested", "start_date")
+
+# Resume each allocation's value path from its stored series_all instead of
+# compounding from start_date every run. Every point except the last is
+# "sealed" behind a watermark this process keeps per allocation; the next
+# run only recomputes the last point plus any new days. The path is rebuilt
+# from scratch when the strategy's returns up to the watermark changed, the
+# allocation's amount/start_date changed, or there is no watermark yet (so
+# the first run after a restart rebuilds everything).
+# Off by default: with the shared growth index a full rebuild is a gather
+# over cached returns, so resuming only adds a series_all read per allocation.
+INCREMENTAL_VALUE_PATH = False
+
+# Keep parsed strategy series (and their growth index) across runs, keyed by
+# strategy_id and invalidated by strategy_metrics.updated_at. Each run then
+# reads only (strategy_id, updated_at) and downloads series_all just for the
+# strategies written since they were cached.
+USE_STRATEGY_SERIES_CACHE = True
+
 
 def now_utc() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
@@ -20,198 +61,434 @@ def now_utc() -> dt.datetime:
 
 # ================ HELPERS ===================
 
-def _strategy_series_to_date_returns(series_all: List[Dict[str, Any]]) -> List[Tuple[dt.date, float]]:
-    """
-    Turn strategy_metrics.series_all (list of {date, pct}) into
-    sorted list of (date_obj, pct_decimal).
-    """
-    data: List[Tuple[dt.date, float]] = []
-    for e in series_all:
-        if not isinstance(e, dict):
-            continue
-        d_str = e.get("date")
-        pct = e.get("pct")
-        if d_str is None or pct is None:
-            continue
-        try:
-            d = dt.date.fromisoformat(d_str)
-            r = float(pct)  # decimal, e.g. 0.01 == 1%
-        except Exception:
-            continue
-        data.append((d, r))
-    data.sort(key=lambda x: x[0])
-    return data
-
-
 def build_value_window_series(series_all: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
     """
     From allocation series_all (list of {date, value}), build 1d,1m,3m,6m,1y,3y,ytd.
     """
-    if not series_all:
-        return {
-            "series_1d": [],
-            "series_1m": [],
-            "series_3m": [],
-            "series_6m": [],
-            "series_1y": [],
-            "series_3y": [],
-            "series_ytd": [],
-        }
+    return slice_windows(series_all, now_utc().date(), STRATEGY_WINDOW_DAYS)
 
-    today = now_utc().date()
-    one_month_ago = today - dt.timedelta(days=30)
-    three_months_ago = today - dt.timedelta(days=90)
-    six_months_ago = today - dt.timedelta(days=180)
-    one_year_ago = today - dt.timedelta(days=365)
-    three_years_ago = today - dt.timedelta(days=3 * 365)
-    ytd_start = dt.date(today.year, 1, 1)
-
-    def filter_from(date_cutoff: dt.date) -> List[Dict[str, Any]]:
-        cutoff_str = date_cutoff.isoformat()
-        return [e for e in series_all if e.get("date", "") >= cutoff_str]
-
-    series_1d = series_all[-1:]  # last point only
-    series_1m = filter_from(one_month_ago)
-    series_3m = filter_from(three_months_ago)
-    series_6m = filter_from(six_months_ago)
-    series_1y = filter_from(one_year_ago)
-    series_3y = filter_from(three_years_ago)
-    series_ytd = filter_from(ytd_start)
 
-    return {
-        "series_1d": series_1d,
-        "series_1m": series_1m,
-        "series_3m": series_3m,
-        "series_6m": series_6m,
-        "series_1y": series_1y,
-        "series_3y": series_3y,
-        "series_ytd": series_ytd,
+# ================ VALUE PATHS ===================
+
+def allocation_values(
+    jobs: List[Dict[str, Any]],
+    strategy_returns: Dict[str, DailyReturns],
+    growth_index: Dict[str, np.ndarray],
+) -> List[np.ndarray]:
+    """
+    Unrounded values for strategy indexes job["first"]..job["hi"]-1 of every
+    job. Each strategy gets one cumulative growth index G per run (cached in
+    `growth_index`), and an allocation's value on strategy day i is
+    amount * G[i + 1] / G[lo], gathered for all of a strategy's jobs at once.
+    """
+    out: List[np.ndarray] = [np.empty(0)] * len(jobs)
+
+    by_strategy: Dict[str, List[int]] = {}
+    for j, job in enumerate(jobs):
+        by_strategy.setdefault(job["strategy_id"], []).append(j)
+
+    for sid, members in by_strategy.items():
+        growth = growth_index.get(sid)
+        if growth is None:
+            growth = growth_index[sid] = cumulative_growth(strategy_returns[sid].returns)
+
+        los = np.array([jobs[j]["lo"] for j in members])
+        base = growth[los]
+        if not base.all():
+            # a -100% day before start_date zeroes G; compound those paths directly
+            for j in (m for m, b in zip(members, base) if b == 0):
+                job = jobs[j]
+                returns = strategy_returns[sid].returns[job["lo"]:job["hi"]]
+                out[j] = compound_values(job["amount"], returns)[job["first"] - job["lo"]:]
+            members = [m for m, b in zip(members, base) if b != 0]
+            if not members:
+                continue
+            los = np.array([jobs[j]["lo"] for j in members])
+            base = growth[los]
+
+        firsts = np.array([jobs[j]["first"] for j in members])
+        lens = np.array([jobs[j]["hi"] - jobs[j]["first"] for j in members])
+        scale = np.array([jobs[j]["amount"] for j in members]) / base
+
+        # flat strategy indexes of every job's days, back to back
+        ends = np.cumsum(lens)
+        idx = np.repeat(firsts - (ends - lens), lens) + np.arange(ends[-1] if len(ends) else 0)
+        values = np.repeat(scale, lens) * growth[idx + 1]
+
+        for j, chunk in zip(members, np.split(values, ends[:-1])):
+            out[j] = chunk
+
+    return out
+
+
+# ================ INCREMENTAL VALUE PATH ===================
+
+# allocation id -> watermark of the last value path this process wrote:
+# {strategy_id, amount_invested, start_date, sealed_index (into the
+#  strategy's returns), sealed_date, path_len, digest (of the strategy's
+#  returns through sealed_index)}
+_value_watermarks: Dict[str, Dict[str, Any]] = {}
+
+
+def _returns_digest(series: DailyReturns, end: int, memo: Dict[Any, str], strategy_id: str) -> str:
+    """Digest of series.returns[:end + 1], memoised per (strategy, end) for one run."""
+    key = (strategy_id, end)
+    digest = memo.get(key)
+    if digest is None:
+        digest = hashlib.blake2b(series.returns[:end + 1].tobytes(), digest_size=16).hexdigest()
+        memo[key] = digest
+    return digest
+
+
+def _resume_value_path(
+    alloc_id: str,
+    row: Dict[str, Any],
+    strat_series: DailyReturns,
+    lo: int,
+    hi: int,
+    digest_memo: Dict[Any, str],
+) -> Tuple[List[Dict[str, Any]], int] | None:
+    """
+    (sealed prefix of the stored path, strategy index it ends at) when the
+    watermark still holds, else None.
+    """
+    mark = _value_watermarks.get(alloc_id)
+    if mark is None:
+        return None
+    if (
+        mark["strategy_id"] != row.get("strategy_id")
+        or mark["amount_invested"] != row.get("amount_invested")
+        or mark["start_date"] != row.get("start_date")
+    ):
+        return None
+
+    idx = mark["sealed_index"]
+    # the sealed day must still be followed by at least one day up to today
+    if idx + 1 >= hi or idx - lo + 1 != mark["path_len"]:
+        return None
+    if strat_series.dates[idx].isoformat() != mark["sealed_date"]:
+        return None
+    if _returns_digest(strat_series, idx, digest_memo, mark["strategy_id"]) != mark["digest"]:
+        return None
+
+    stored = decode_series(row.get("series_all"))
+    path_len = mark["path_len"]
+    if len(stored) < path_len or stored[path_len - 1].get("date") != mark["sealed_date"]:
+        return None
+
+    return stored[:path_len], idx
+
+
+def _seal_value_path(
+    alloc_id: str,
+    row: Dict[str, Any],
+    strat_series: DailyReturns,
+    lo: int,
+    hi: int,
+    digest_memo: Dict[Any, str],
+) -> None:
+    """Remember everything but the last point of the path just built (strategy indexes lo..hi-1)."""
+    if hi - lo < 2:
+        _value_watermarks.pop(alloc_id, None)
+        return
+
+    idx = hi - 2
+    _value_watermarks[alloc_id] = {
+        "strategy_id": row.get("strategy_id"),
+        "amount_invested": row.get("amount_invested"),
+        "start_date": row.get("start_date"),
+        "sealed_index": idx,
+        "sealed_date": strat_series.dates[idx].isoformat(),
+        "path_len": idx - lo + 1,
+        "digest": _returns_digest(strat_series, idx, digest_memo, row.get("strategy_id")),
     }
 
 
 # ================ MAIN ENGINE ===================
 
-def update_demo_allocations_from_strategies():
-    print("[INFO] Loading strategy_metrics (series_all)...")
-
-    # Get strategy returns once, build a map: strategy_id -> [(date, pct_decimal)]
-    strat_resp = supabase.table("strategy_metrics").select("strategy_id, series_all").execute()
-    strat_rows = strat_resp.data or []
-
-    strategy_returns: Dict[str, List[Tuple[dt.date, float]]] = {}
+def iter_rows_for_strategies(
+    table: str,
+    columns: str,
+    key: str,
+    page_size: int,
+    strategy_ids: Set[str] | None,
+):
+    """Stream `table`, either in full or only rows whose strategy_id is in `strategy_ids`."""
+    if strategy_ids is None:
+        yield from iter_rows(supabase, table, columns, key=key, page_size=page_size)
+        return
+
+    ids = sorted(strategy_ids)
+    for i in range(0, len(ids), STRATEGY_READ_PAGE_SIZE):
+        chunk = ids[i:i + STRATEGY_READ_PAGE_SIZE]
+        yield from iter_rows(
+            supabase, table, columns, key=key, page_size=page_size, filters=[("in_", "strategy_id", chunk)]
+        )
+
+
+def load_strategy_returns(strategy_ids: Set[str] | None) -> Dict[str, DailyReturns]:
+    """strategy_id -> parsed series_all (decimal returns), downloaded in full."""
+    strategy_returns: Dict[str, DailyReturns] = {}
+    strat_rows = iter_rows_for_strategies(
+        "strategy_metrics", "strategy_id, series_all", "strategy_id", STRATEGY_READ_PAGE_SIZE, strategy_ids
+    )
     for row in strat_rows:
         sid = row.get("strategy_id")
         if not sid:
             continue
-        series_all = row.get("series_all") or []
-        if not isinstance(series_all, list):
-            series_all = []
-        strategy_returns[sid] = _strategy_series_to_date_returns(series_all)
+        strategy_returns[sid] = parse_daily_returns(decode_series(row.get("series_all")))
+    return strategy_returns
 
-    print(f"[INFO] Loaded {len(strategy_returns)} strategies with return series")
 
-    print("[INFO] Fetching demo_allocations rows...")
-    alloc_resp = supabase.table("demo_allocations").select("*").execute()
-    alloc_rows = alloc_resp.data or []
+class StrategySeriesCache:
+    """
+    Parsed strategy_metrics.series_all kept across scheduler iterations.
 
-    print(f"[INFO] Found {len(alloc_rows)} demo allocations")
+    load() reads only strategy_id/updated_at, then downloads and parses
+    series_all for strategies that are new or whose updated_at moved since
+    they were cached. Rows without updated_at are never trusted. The
+    cumulative growth index of each strategy (see allocation_values) is
+    cached alongside and dropped whenever its series is refetched.
+    """
 
-    today = now_utc().date()
+    def __init__(self):
+        self.returns: Dict[str, DailyReturns] = {}
+        self.growth: Dict[str, np.ndarray] = {}
+        self.versions: Dict[str, str] = {}
+
+    def clear(self) -> None:
+        self.returns.clear()
+        self.growth.clear()
+        self.versions.clear()
+
+    def _forget(self, sid: str) -> None:
+        self.returns.pop(sid, None)
+        self.growth.pop(sid, None)
+        self.versions.pop(sid, None)
+
+    def load(self, strategy_ids: Set[str] | None) -> Dict[str, DailyReturns]:
+        index = {
+            row["strategy_id"]: row.get("updated_at")
+            for row in iter_rows_for_strategies(
+                "strategy_metrics", "strategy_id, updated_at", "strategy_id", READ_PAGE_SIZE, strategy_ids
+            )
+            if row.get("strategy_id")
+        }
 
-    for row in alloc_rows:
-        alloc_id = row.get("id")
-        strategy_id = row.get("strategy_id")
-        amount_invested_raw = row.get("amount_invested")
-        start_date_raw = row.get("start_date")
+        if strategy_ids is None:
+            for sid in [sid for sid in self.versions if sid not in index]:
+                self._forget(sid)
+
+        stale = {sid for sid, version in index.items() if version is None or self.versions.get(sid) != version}
+        if stale:
+            print(f"[INFO] Downloading series_all for {len(stale)} of {len(index)} strategies")
+            strat_rows = iter_rows_for_strategies(
+                "strategy_metrics", "strategy_id, updated_at, series_all", "strategy_id", STRATEGY_READ_PAGE_SIZE, stale
+            )
+            for row in strat_rows:
+                sid = row.get("strategy_id")
+                if not sid:
+                    continue
+                self._forget(sid)
+                self.returns[sid] = parse_daily_returns(decode_series(row.get("series_all")))
+                # the version read with the series, so a write in between is refetched next run
+                if row.get("updated_at") is not None:
+                    self.versions[sid] = row["updated_at"]
+
+        return {sid: self.returns[sid] for sid in index if sid in self.returns}
+
+
+strategy_cache = StrategySeriesCache()
+
+
+def _prepare_allocation(
+    row: Dict[str, Any],
+    strategy_returns: Dict[str, DailyReturns],
+    today: dt.date,
+    incremental: bool,
+    digest_memo: Dict[Any, str],
+) -> Dict[str, Any] | None:
+    """
+    Validate one demo_allocations row and work out which strategy days its
+    path needs: lo..hi-1 in full, or only first..hi-1 after a stored prefix.
+    """
+    alloc_id = row.get("id")
+    strategy_id = row.get("strategy_id")
+    amount_invested_raw = row.get("amount_invested")
+    start_date_raw = row.get("start_date")
+
+    if not alloc_id or not strategy_id or amount_invested_raw is None or start_date_raw is None:
+        return None
+
+    try:
+        amount_invested = float(amount_invested_raw)
+    except (TypeError, ValueError):
+        print(f"[WARN] Allocation {alloc_id}: invalid amount_invested, skipping")
+        return None
+
+    try:
+        start_date = dt.date.fromisoformat(start_date_raw)
+    except Exception:
+        print(f"[WARN] Allocation {alloc_id}: invalid start_date, skipping")
+        return None
+
+    print(f"[INFO] Updating demo allocation {alloc_id} (strategy {strategy_id})")
+
+    strat_series = strategy_returns.get(strategy_id)
+    if not strat_series or not strat_series.dates:
+        print(f"[INFO] Allocation {alloc_id}: no strategy series found, skipping")
+        return None
+
+    # Strategy daily returns for dates >= start_date and <= today
+    lo = bisect_left(strat_series.dates, start_date)
+    hi = bisect_right(strat_series.dates, today)
+    if lo >= hi:
+        print(f"[INFO] Allocation {alloc_id}: no strategy returns after start_date, skipping")
+        return None
+
+    resume = _resume_value_path(alloc_id, row, strat_series, lo, hi, digest_memo) if incremental else None
+    prefix, first = ([], lo) if resume is None else (resume[0], resume[1] + 1)
 
-        if not alloc_id or not strategy_id or amount_invested_raw is None or start_date_raw is None:
-            continue
+    return {
+        "alloc_id": alloc_id,
+        "row": row,
+        "strategy_id": strategy_id,
+        "amount": amount_invested,
+        "lo": lo,
+        "hi": hi,
+        "first": first,
+        "prefix": prefix,
+        "resumed": resume is not None,
+    }
 
-        try:
-            amount_invested = float(amount_invested_raw)
-        except (TypeError, ValueError):
-            print(f"[WARN] Allocation {alloc_id}: invalid amount_invested, skipping")
-            continue
 
-        try:
-            start_date = dt.date.fromisoformat(start_date_raw)
-        except Exception:
-            print(f"[WARN] Allocation {alloc_id}: invalid start_date, skipping")
-            continue
+def build_allocation_payload(job: Dict[str, Any], dates: List[dt.date], values: np.ndarray) -> Dict[str, Any]:
+    """demo_allocations upsert for one job, given the values of its new days."""
+    row = job["row"]
+    amount_invested = job["amount"]
 
-        print(f"[INFO] Updating demo allocation {alloc_id} (strategy {strategy_id})")
+    # Stored prefix (if any) plus the recomputed trailing days
+    value_series: List[Dict[str, Any]] = job["prefix"] + [
+        {"date": d.isoformat(), "value": round(v, 2)}
+        for d, v in zip(dates, values.tolist())
+    ]
 
-        strat_series = strategy_returns.get(strategy_id)
-        if not strat_series:
-            print(f"[INFO] Allocation {alloc_id}: no strategy series found, skipping")
-            continue
+    # Windows
+    windows = build_value_window_series(value_series)
 
-        # Filter strategy daily returns for dates >= start_date and <= today
-        strat_rets = [(d, r) for (d, r) in strat_series if d >= start_date and d <= today]
-        if not strat_rets:
-            print(f"[INFO] Allocation {alloc_id}: no strategy returns after start_date, skipping")
-            continue
+    # Latest
+    latest_value = value_series[-1]["value"]
+    if amount_invested > 0:
+        latest_return_pct = (latest_value / amount_invested) - 1.0  # decimal: 0.09 == 9%
+    else:
+        latest_return_pct = None
 
-        # Build allocation value path from scratch every time
-        value_series: List[Dict[str, Any]] = []
-        prev_value = amount_invested
+    return {
+        **{col: row.get(col) for col in ALLOCATION_IDENTITY_COLUMNS if col in row},
+        "series_all": encode_for_storage(value_series, value_key="value"),
+        "series_1d": encode_for_storage(windows["series_1d"], value_key="value"),
+        **window_columns(value_series, windows, value_key="value"),
+        "latest_value": latest_value,
+        "latest_return_pct": latest_return_pct,
+    }
 
-        for d, r in strat_rets:
-            # r is decimal, e.g. 0.01 == 1%
-            prev_value = prev_value * (1.0 + r)
-            value_series.append({
-                "date": d.isoformat(),
-                "value": round(prev_value, 2),
-            })
 
-        if not value_series:
-            print(f"[INFO] Allocation {alloc_id}: no value series built, skipping update")
-            continue
+def update_demo_allocations_from_strategies(
+    changed_strategies: Set[str] | None = None,
+    incremental: bool = INCREMENTAL_VALUE_PATH,
+    use_cache: bool = USE_STRATEGY_SERIES_CACHE,
+) -> Set[str]:
+    """
+    Rebuild demo_allocations value paths from strategy_metrics. With
+    `changed_strategies` (pipeline mode) only allocations following those
+    strategies are touched. With `incremental`, paths resume from their
+    stored series_all (see INCREMENTAL_VALUE_PATH); with `use_cache`,
+    strategy series come from strategy_cache. Returns the allocation ids
+    written.
+    """
+    if changed_strategies is not None and not changed_strategies:
+        print("[INFO] No strategies changed, nothing to update")
+        return set()
 
-        # Ensure sorted
-        try:
-            value_series.sort(key=lambda x: x.get("date", ""))
-        except Exception as e:
-            print(f"[WARN] Allocation {alloc_id}: could not sort series_all: {e}")
-
-        # Windows
-        windows = build_value_window_series(value_series)
-
-        # Latest
-        latest_value = value_series[-1]["value"]
-        if amount_invested > 0:
-            latest_return_pct = (latest_value / amount_invested) - 1.0  # decimal: 0.09 == 9%
-        else:
-            latest_return_pct = None
-
-        update_payload = {
-            "series_all": value_series,
-            "series_1d": windows["series_1d"],
-            "series_1m": windows["series_1m"],
-            "series_3m": windows["series_3m"],
-            "series_6m": windows["series_6m"],
-            "series_1y": windows["series_1y"],
-            "series_3y": windows["series_3y"],
-            "series_ytd": windows["series_ytd"],
-            "latest_value": latest_value,
-            "latest_return_pct": latest_return_pct,
-        }
+    print("[INFO] Loading strategy_metrics (series_all)...")
+
+    # Strategy returns once per run: strategy_id -> DailyReturns (decimal)
+    if use_cache:
+        strategy_returns = strategy_cache.load(changed_strategies)
+        growth_index = strategy_cache.growth
+    else:
+        strategy_returns = load_strategy_returns(changed_strategies)
+        growth_index = {}
+
+    print(f"[INFO] Loaded {len(strategy_returns)} strategies with return series")
 
-        supabase.table("demo_allocations").update(update_payload).eq("id", alloc_id).execute()
-        print(f"[INFO] Allocation {alloc_id} updated. series_all length: {len(value_series)}")
+    print("[INFO] Fetching demo_allocations rows...")
+    alloc_columns = ALLOCATION_IDENTITY_COLUMNS + (("series_all",) if incremental else ())
+    alloc_rows = iter_rows_for_strategies(
+        "demo_allocations", ", ".join(alloc_columns), "id", READ_PAGE_SIZE, changed_strategies
+    )
+    seen = 0
+    resumed = 0
+    digest_memo: Dict[Any, str] = {}
+
+    today = now_utc().date()
+
+    writer = BulkUpsertWriter(
+        supabase,
+        "demo_allocations",
+        key="id",
+        batch_size=WRITE_BATCH_SIZE,
+        required_columns=ALLOCATION_IDENTITY_COLUMNS,
+    )
+    written: Set[str] = set()
 
+    # One read page at a time, so each strategy's allocations share a single gather
+    while True:
+        page = list(islice(alloc_rows, READ_PAGE_SIZE))
+        if not page:
+            break
+        seen += len(page)
+
+        jobs = [
+            job for job in (
+                _prepare_allocation(row, strategy_returns, today, incremental, digest_memo) for row in page
+            )
+            if job is not None
+        ]
+
+        for job, values in zip(jobs, allocation_values(jobs, strategy_returns, growth_index)):
+            alloc_id = job["alloc_id"]
+            strat_series = strategy_returns[job["strategy_id"]]
+            update_payload = build_allocation_payload(job, strat_series.dates[job["first"]:job["hi"]], values)
+
+            if incremental:
+                _seal_value_path(alloc_id, job["row"], strat_series, job["lo"], job["hi"], digest_memo)
+                resumed += job["resumed"]
+
+            writer.add(update_payload)
+            written.add(alloc_id)
+            print(f"[INFO] Allocation {alloc_id} queued. series_all length: {job['hi'] - job['lo']}")
+
+    writer.flush()
+    writer.report()
+
+    print(f"[INFO] Scanned {seen} demo allocations")
+    if incremental:
+        print(f"[INFO] Resumed {resumed} value paths from their stored series_all")
     print("[INFO] Done updating demo_allocations.")
 
+    return written
+
 
 # ================ SCHEDULER LOOP ===================
 
 if __name__ == "__main__":
-    print("[ENGINE] Demo allocations engine started. Running every 10 minutes.")
-    while True:
-        try:
-            print(f"\n[ENGINE] Run at {now_utc().isoformat()}")
-            update_demo_allocations_from_strategies()
-        except Exception as e:
-            print(f"[ERROR] Engine run failed: {e}")
-        # sleep 10 minutes
-        time.sleep(600)
+    print(
+        "[ENGINE] Demo allocations engine started. Every "
+        f"{INTRADAY_INTERVAL_SECONDS // 60} minutes during the NYSE session, plus a post-close settlement pass."
+    )
+    run_market_scheduler(
+        lambda phase: update_demo_allocations_from_strategies(),
+        "Demo allocations engine",
+        INTRADAY_INTERVAL_SECONDS,
+    )
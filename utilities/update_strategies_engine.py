@@ -1,9 +1,27 @@
 import os
-import time
 import datetime as dt
-from typing import Dict, List, Any, Tuple
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, NamedTuple, Set, Tuple
 from supabase import create_client, Client
-from statistics import pstdev
+
+import numpy as np
+
+from analytics import PERCENT, calendar_rows, parse_daily_returns
+from bar_store import BarStore, iso_to_epoch_minute
+from market_calendar import run_market_scheduler
+from perf_accumulator import PerfAccumulator
+from series_codec import decode_series, encode_for_storage, is_compact
+from series_windows import (
+    STRATEGY_WINDOW_DAYS,
+    WINDOW_COLUMNS,
+    WINDOW_INDEX_ENABLED,
+    slice_windows,
+    window_columns,
+)
+from supabase_reader import iter_pages, iter_rows
+from supabase_writer import BulkUpsertWriter, FieldFingerprints
 
 # ==========================
 # CONFIG
@@ -13,13 +31,234 @@ SUPABASE_SERVICE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmF
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+# strategy_metrics payloads are flushed as bulk upserts of this size
+WRITE_BATCH_SIZE = 50
+
+# Sent with every strategy_metrics upsert so its insert half satisfies the
+# table's NOT NULL constraints (besides strategy_id, the admin page only
+# sets portfolio_holdings and asset_allocation when it creates a row).
+STRATEGY_REQUIRED_COLUMNS = ("portfolio_holdings",)
+
+# strategy_metrics is streamed in pages of this many rows (see supabase_reader.py)
+READ_PAGE_SIZE = 100
+
+# Every column build_strategy_payload writes (besides updated_at) is read
+# back with the page, so PARTIAL_WRITES diffs each one against what is
+# stored rather than against what this process last sent; alpaca_metrics.py
+# writes calendar_returns and the window columns too, in its own units.
+STRATEGY_COLUMNS = ", ".join((
+    "strategy_id", "portfolio_holdings", "series_all", "perf_summary", "perf_state", "asof_date",
+    "calendar_returns", "series_1d", *WINDOW_COLUMNS,
+    *(("series_windows",) if WINDOW_INDEX_ENABLED else ()),
+))
+
+# Evaluate each page of strategies with one universe read and one matrix
+# product instead of a universe read and a weighted walk per strategy.
+BATCH_EVALUATION = True
+
+# Carry perf_summary statistics between runs in strategy_metrics.perf_state
+# (a column of its own, so pages selecting perf_summary never download it)
+# and fold in only new days instead of recomputing over the full history.
+INCREMENTAL_PERF_SUMMARY = True
+
+# Evaluate strategies in this many worker processes against a return matrix
+# held in shared memory (see EvaluationPool); 1 keeps evaluation in this
+# process. The pool and matrix are set up once per run and every page of
+# strategies is handed to the same workers. Runs with fewer than
+# PARALLEL_MIN_STRATEGIES strategies to recompute stay in-process: start-up
+# costs about as much as evaluating two strategies with three years of
+# history, and small runs (typical intraday passes under dirty tracking)
+# finish before the workers would. One worker per CPU, capped at 4; on a
+# single-CPU host this is 1 and the pool is off.
+EVALUATION_WORKERS = max(1, min(4, os.cpu_count() or 1))
+PARALLEL_MIN_STRATEGIES = 50
+
+# Refresh cadence while the NYSE session is open (see market_calendar.py)
+INTRADAY_INTERVAL_SECONDS = 1200
+
+# Read daily/intraday pct from the local bar store written by the universe
+# updater (BAR_STORE_ENABLED there; pipeline.py runs both in one process)
+# instead of trading_universe. Batch and parallel evaluation build the return
+# matrix straight from the memory-mapped columns; symbols missing locally
+# fall back to the table through the symbol cache.
+USE_BAR_STORE = True
+INTRADAY_LOOKBACK_HOURS = 24
+
+# Serve trading_universe reads from one shared, parsed-once symbol cache.
+# With SYMBOL_CACHE_TTL_SECONDS = None the cache lives for a single run;
+# a number keeps entries across scheduler iterations until they expire.
+USE_SYMBOL_CACHE = True
+SYMBOL_CACHE_TTL_SECONDS = None
+SYMBOL_CACHE_FETCH_CHUNK = 100
+
+# Only recompute strategies whose held symbols were refreshed in
+# trading_universe since the strategy was last written (or, if that run had
+# nothing to write, last evaluated by this process), whose asof_date is not
+# today, or whose holdings changed since this process last evaluated
+# them (so the first run after a restart recomputes everything). Universe
+# updates within the grace period before the watermark still count, since
+# the universe writer timestamps rows before they are flushed.
+DIRTY_TRACKING = True
+DIRTY_TRACKING_GRACE_SECONDS = 300
+STRATEGY_INDEX_COLUMNS = "strategy_id, portfolio_holdings, updated_at, asof_date"
+
+# Send only the strategy_metrics columns whose content differs from what was
+# last read or written (see FieldFingerprints in supabase_writer.py). A row
+# whose only change would be updated_at is not written at all; dirty
+# tracking then uses the evaluation time this process recorded for it.
+# asof_date is ordinary data and is sent whenever the day rolls over.
+PARTIAL_WRITES = True
+PARTIAL_WRITE_TOUCH_COLUMNS = ("updated_at",)
+
+bar_store = BarStore()
+strategy_fingerprints = FieldFingerprints(touch_columns=PARTIAL_WRITE_TOUCH_COLUMNS)
+
 
 def now_utc() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
 
+def _parse_timestamp(value: Any) -> dt.datetime | None:
+    if not value:
+        return None
+    try:
+        ts = dt.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+
 # ================ UNIVERSE HELPERS ===================
 
+def parse_closes_entries(entries: List[Any]) -> List[Tuple[dt.date, str, float]]:
+    """Valid closes_30d entries as (date, date_str, pct_decimal), sorted by date."""
+    parsed: List[Tuple[dt.date, str, float]] = []
+
+    for e in entries:
+        if not isinstance(e, dict):
+            continue
+        date_str = e.get("date")
+        pct = e.get("pct")
+        if date_str is None or pct is None:
+            continue
+
+        try:
+            d = dt.date.fromisoformat(date_str)
+        except Exception:
+            continue
+
+        try:
+            parsed.append((d, date_str, float(pct)))
+        except (TypeError, ValueError):
+            continue
+
+    parsed.sort(key=lambda x: x[0])
+    return parsed
+
+
+def select_date_range(
+    parsed: List[Tuple[dt.date, str, float]],
+    start_date: dt.date | None,
+    end_date: dt.date | None,
+) -> Dict[str, float]:
+    """{date_str: pct} for parsed entries with start_date <= date <= end_date (bounds optional)."""
+    lo = 0 if start_date is None else bisect_left(parsed, start_date, key=lambda x: x[0])
+    hi = len(parsed) if end_date is None else bisect_right(parsed, end_date, key=lambda x: x[0])
+    return {date_str: pct for _, date_str, pct in parsed[lo:hi]}
+
+
+class IntradayReturns(NamedTuple):
+    """One symbol's intraday pct (decimal) keyed by epoch minute, sorted and unique."""
+    minute: np.ndarray
+    pct: np.ndarray
+
+
+def _stamps_to_epoch_minutes(stamps: List[str]) -> np.ndarray | None:
+    """
+    Vectorised parse of Alpaca-style 'YYYY-MM-DDTHH:MM:SSZ' stamps: the
+    stamps are laid out as one fixed-width byte matrix and the minute
+    prefix is converted by numpy in one call. None if any stamp has another
+    shape (the caller then parses each one with fromisoformat).
+    """
+    try:
+        raw = "".join(stamps).encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    if len(raw) != 20 * len(stamps):
+        return None
+
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 20)
+    shape_ok = (
+        (rows[:, 4] == ord("-")) & (rows[:, 7] == ord("-")) & (rows[:, 10] == ord("T"))
+        & (rows[:, 13] == ord(":")) & (rows[:, 16] == ord(":")) & (rows[:, 19] == ord("Z"))
+    )
+    if not shape_ok.all():
+        return None
+
+    try:
+        prefix = np.ascontiguousarray(rows[:, :16]).view("S16").ravel()
+        return prefix.astype("datetime64[m]").astype(np.int64)
+    except ValueError:
+        return None
+
+
+def _intraday_from_pairs(minutes: np.ndarray, pct: np.ndarray) -> IntradayReturns:
+    """Sort by minute and keep the last value for duplicate minutes."""
+    rev_minutes = minutes[::-1]
+    _, rev_idx = np.unique(rev_minutes, return_index=True)
+    idx = len(rev_minutes) - 1 - rev_idx
+    return IntradayReturns(minutes[idx], pct[idx])
+
+
+def parse_intraday_entries(entries: Any) -> IntradayReturns:
+    """
+    Valid intraday entries as epoch-minute/pct arrays. Accepts the raw
+    trading_universe column: compact minute series are read straight from
+    their offsets, legacy lists are parsed once (vectorised when the stamps
+    are plain UTC).
+    """
+    if is_compact(entries) and entries.get("unit") == "minute" and entries.get("start"):
+        try:
+            base = iso_to_epoch_minute(entries["start"])
+            minutes = base + np.asarray(entries.get("offsets") or [], dtype=np.int64)
+            pct = np.asarray(entries.get("values") or [], dtype=np.float64)
+            n = min(len(minutes), len(pct))
+            return _intraday_from_pairs(minutes[:n], pct[:n])
+        except (TypeError, ValueError):
+            pass
+
+    stamps: List[str] = []
+    values: List[float] = []
+    for e in decode_series(entries):
+        if not isinstance(e, dict):
+            continue
+        ts_str = e.get("ts")
+        pct = e.get("pct")
+
+        if not isinstance(ts_str, str) or pct is None:
+            continue
+        try:
+            values.append(float(pct))
+        except (TypeError, ValueError):
+            continue
+        stamps.append(ts_str)
+
+    minutes = _stamps_to_epoch_minutes(stamps)
+    if minutes is None:
+        keep: List[int] = []
+        parsed: List[int] = []
+        for i, ts_str in enumerate(stamps):
+            try:
+                parsed.append(iso_to_epoch_minute(ts_str))
+                keep.append(i)
+            except ValueError:
+                continue
+        minutes = np.asarray(parsed, dtype=np.int64)
+        values = [values[i] for i in keep]
+
+    return _intraday_from_pairs(minutes, np.asarray(values, dtype=np.float64))
+
+
 def build_symbol_pct_from_universe(
     symbols: List[str],
     start_date: dt.date | None,
@@ -52,45 +291,17 @@ def build_symbol_pct_from_universe(
         if not symbol:
             continue
 
-        entries = row.get("closes_30d") or []
-        if not isinstance(entries, list):
-            continue
-
-        date_to_pct: Dict[str, float] = {}
-
-        for e in entries:
-            if not isinstance(e, dict):
-                continue
-            date_str = e.get("date")
-            pct = e.get("pct")
-            if date_str is None or pct is None:
-                continue
-
-            try:
-                d = dt.date.fromisoformat(date_str)
-            except Exception:
-                continue
-
-            # allow reloading for the existing last date
-            if start_date and d < start_date:
-                continue
-            if end_date and d > end_date:
-                continue
-
-            try:
-                date_to_pct[date_str] = float(pct)
-            except (TypeError, ValueError):
-                continue
-
-        symbol_map[symbol] = date_to_pct
+        # allow reloading for the existing last date
+        parsed = parse_closes_entries(decode_series(row.get("closes_30d")))
+        symbol_map[symbol] = select_date_range(parsed, start_date, end_date)
 
     return symbol_map
 
 
-def build_symbol_intraday_from_universe(symbols: List[str]) -> Dict[str, Dict[str, float]]:
+def build_symbol_intraday_from_universe(symbols: List[str]) -> Dict[str, IntradayReturns]:
     """
-    Pull intraday pct history (ts -> pct_decimal) from trading_universe
-    for the given symbols.
+    Pull intraday pct history (epoch minute -> pct_decimal) from
+    trading_universe for the given symbols.
     """
     if not symbols:
         return {}
@@ -105,36 +316,241 @@ def build_symbol_intraday_from_universe(symbols: List[str]) -> Dict[str, Dict[st
     )
     rows = resp.data or []
 
-    symbol_map: Dict[str, Dict[str, float]] = {}
+    symbol_map: Dict[str, IntradayReturns] = {}
 
     for row in rows:
         symbol = row.get("symbol")
         if not symbol:
             continue
 
-        entries = row.get("intraday") or []
-        if not isinstance(entries, list):
+        symbol_map[symbol] = parse_intraday_entries(row.get("intraday"))
+
+    return symbol_map
+
+
+class UniverseSymbolCache:
+    """
+    Parsed trading_universe data shared by every strategy in a run.
+
+    prefetch() downloads closes_30d and intraday for the symbols not yet
+    cached (or expired) in chunks of SYMBOL_CACHE_FETCH_CHUNK, parsing
+    each symbol once. Strategies are then served from memory. With
+    ttl_seconds set, entries survive across scheduler iterations until they
+    expire; otherwise clear() is called at the start of every run.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None):
+        self.ttl_seconds = ttl_seconds
+        self.daily: Dict[str, List[Tuple[dt.date, str, float]]] = {}
+        self.intraday: Dict[str, IntradayReturns] = {}
+        self.loaded_at: Dict[str, dt.datetime] = {}
+
+    def clear(self) -> None:
+        self.daily.clear()
+        self.intraday.clear()
+        self.loaded_at.clear()
+
+    def _fresh(self, symbol: str, now: dt.datetime) -> bool:
+        loaded = self.loaded_at.get(symbol)
+        if loaded is None:
+            return False
+        return self.ttl_seconds is None or (now - loaded).total_seconds() < self.ttl_seconds
+
+    def prefetch(self, symbols: List[str]) -> None:
+        now = now_utc()
+        missing = sorted({s for s in symbols if s and not self._fresh(s, now)})
+        if not missing:
+            return
+
+        print(f"[INFO] Prefetching trading_universe data for {len(missing)} symbols")
+
+        for i in range(0, len(missing), SYMBOL_CACHE_FETCH_CHUNK):
+            chunk = missing[i:i + SYMBOL_CACHE_FETCH_CHUNK]
+            for symbol in chunk:
+                self.daily.pop(symbol, None)
+                self.intraday.pop(symbol, None)
+
+            resp = (
+                supabase.table("trading_universe")
+                .select("symbol, closes_30d, intraday")
+                .in_("symbol", chunk)
+                .execute()
+            )
+            for row in resp.data or []:
+                symbol = row.get("symbol")
+                if not symbol:
+                    continue
+                self.daily[symbol] = parse_closes_entries(decode_series(row.get("closes_30d")))
+                self.intraday[symbol] = parse_intraday_entries(row.get("intraday"))
+
+            # symbols without a universe row are cached as absent too
+            for symbol in chunk:
+                self.loaded_at[symbol] = now
+
+    def invalidate(self, symbols) -> None:
+        for symbol in symbols:
+            self.loaded_at.pop(symbol, None)
+
+    def invalidate_updated(self, watermarks: Dict[str, dt.datetime]) -> None:
+        """
+        Forget symbols whose trading_universe row changed after they were
+        cached. The universe writer stamps last_updated_at before the row is
+        flushed, so stamps up to DIRTY_TRACKING_GRACE_SECONDS before the load
+        count as changes too.
+        """
+        grace = dt.timedelta(seconds=DIRTY_TRACKING_GRACE_SECONDS)
+        for symbol, updated in watermarks.items():
+            loaded = self.loaded_at.get(symbol)
+            if loaded is not None and updated > loaded - grace:
+                del self.loaded_at[symbol]
+
+    def symbol_pct_map(
+        self,
+        symbols: List[str],
+        start_date: dt.date | None,
+        end_date: dt.date | None,
+    ) -> Dict[str, Dict[str, float]]:
+        """Same contract as build_symbol_pct_from_universe."""
+        self.prefetch(symbols)
+        return {
+            s: select_date_range(self.daily[s], start_date, end_date)
+            for s in symbols
+            if s in self.daily
+        }
+
+    def symbol_intraday_map(self, symbols: List[str]) -> Dict[str, IntradayReturns]:
+        """Same contract as build_symbol_intraday_from_universe."""
+        self.prefetch(symbols)
+        return {s: self.intraday[s] for s in symbols if s in self.intraday}
+
+
+symbol_cache = UniverseSymbolCache(ttl_seconds=SYMBOL_CACHE_TTL_SECONDS)
+
+
+def load_strategy_index() -> List[Dict[str, Any]]:
+    """
+    Light scan of strategy_metrics (no series columns): strategy_id,
+    normalised weights and the updated_at/asof_date watermarks.
+    """
+    index: List[Dict[str, Any]] = []
+    for row in iter_rows(supabase, "strategy_metrics", STRATEGY_INDEX_COLUMNS, key="strategy_id"):
+        strategy_id = row.get("strategy_id")
+        holdings = row.get("portfolio_holdings") or []
+        if not strategy_id or not isinstance(holdings, list):
             continue
+        index.append({
+            "strategy_id": strategy_id,
+            "weights": strategy_weights_from_holdings(holdings),
+            "updated_at": _parse_timestamp(row.get("updated_at")),
+            "asof_date": row.get("asof_date"),
+        })
+    return index
 
-        ts_to_pct: Dict[str, float] = {}
 
-        for e in entries:
-            if not isinstance(e, dict):
-                continue
-            ts_str = e.get("ts")
-            pct = e.get("pct")
+def held_symbols(index: List[Dict[str, Any]]) -> List[str]:
+    """Union of symbols held by the given strategies."""
+    return sorted({sym for entry in index for sym in entry["weights"]})
 
-            if ts_str is None or pct is None:
-                continue
 
-            try:
-                # validate ts
-                dt.datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                ts_to_pct[ts_str] = float(pct)
-            except Exception:
-                continue
+def universe_symbol_pct(
+    symbols: List[str],
+    start_date: dt.date | None,
+    end_date: dt.date | None,
+) -> Dict[str, Dict[str, float]]:
+    """Daily pct maps from trading_universe, through symbol_cache when enabled."""
+    if USE_SYMBOL_CACHE:
+        return symbol_cache.symbol_pct_map(symbols, start_date, end_date)
+    return build_symbol_pct_from_universe(symbols=symbols, start_date=start_date, end_date=end_date)
+
+
+def universe_symbol_intraday(symbols: List[str]) -> Dict[str, IntradayReturns]:
+    """Intraday returns from trading_universe, through symbol_cache when enabled."""
+    if USE_SYMBOL_CACHE:
+        return symbol_cache.symbol_intraday_map(symbols)
+    return build_symbol_intraday_from_universe(symbols)
+
+
+def daily_columns(sym_map: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """(epoch days, pct) arrays for a {iso date: pct} map, in the map's order."""
+    days = np.array(list(sym_map), dtype="datetime64[D]").astype(np.int64)
+    return days, np.fromiter(sym_map.values(), dtype=np.float64, count=len(sym_map))
+
+
+def build_symbol_pct_from_bar_store(
+    symbols: List[str],
+    start_date: dt.date | None,
+    end_date: dt.date | None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Same contract as build_symbol_pct_from_universe, served from the local
+    bar store (used by the sequential path, which walks per-date dicts);
+    symbols not in the store are read from trading_universe.
+    """
+    symbol_map: Dict[str, Dict[str, float]] = {}
+    missing: List[str] = []
+
+    for symbol in symbols:
+        bars = bar_store.read_daily(symbol, start_date, end_date)
+        if bars is None:
+            missing.append(symbol)
+            continue
+        dates = bars.day.astype("datetime64[D]").astype(str).tolist()
+        symbol_map[symbol] = dict(zip(dates, bars.pct.tolist()))
+
+    if missing:
+        symbol_map.update(universe_symbol_pct(missing, start_date, end_date))
+
+    return symbol_map
+
+
+def daily_columns_from_bar_store(
+    symbols: List[str],
+    start_date: dt.date | None,
+    end_date: dt.date | None,
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    {symbol: (epoch days, pct)} for the batch path: the bar store's
+    memory-mapped day/pct columns sliced to the range without copying or
+    building Python objects. Symbols not in the store are read from
+    trading_universe.
+    """
+    columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    missing: List[str] = []
+
+    for symbol in symbols:
+        bars = bar_store.read_daily(symbol, start_date, end_date)
+        if bars is None:
+            missing.append(symbol)
+            continue
+        columns[symbol] = (bars.day, bars.pct)
+
+    if missing:
+        for symbol, sym_map in universe_symbol_pct(missing, start_date, end_date).items():
+            columns[symbol] = daily_columns(sym_map)
+
+    return columns
+
 
-        symbol_map[symbol] = ts_to_pct
+def build_symbol_intraday_from_bar_store(symbols: List[str]) -> Dict[str, IntradayReturns]:
+    """
+    Same contract as build_symbol_intraday_from_universe for the last
+    INTRADAY_LOOKBACK_HOURS, served from the bar store's minute partitions.
+    """
+    end_minute = int(now_utc().timestamp()) // 60 + 1
+    start_minute = end_minute - INTRADAY_LOOKBACK_HOURS * 60
+
+    symbol_map: Dict[str, IntradayReturns] = {}
+    missing: List[str] = []
+
+    for symbol in symbols:
+        bars = bar_store.read_minutes(symbol, start_minute, end_minute)
+        if bars is None:
+            missing.append(symbol)
+            continue
+        symbol_map[symbol] = IntradayReturns(np.asarray(bars.minute, dtype=np.int64), np.asarray(bars.pct))
+
+    if missing:
+        symbol_map.update(universe_symbol_intraday(missing))
 
     return symbol_map
 
@@ -170,39 +586,33 @@ def compute_weighted_daily_series_from_universe(
 
 def compute_weighted_intraday_series_from_universe(
     weights: Dict[str, float],
-    symbol_intraday_map: Dict[str, Dict[str, float]],
+    symbol_intraday_map: Dict[str, IntradayReturns],
 ) -> List[Dict[str, Any]]:
     """
-    Combine intraday pct entries (decimal) by timestamp across symbols
-    using the provided weights. Output entries keep the timestamp in the
-    "date" field for consistency with strategy_metrics schema.
-    """
-
-    all_ts: set[str] = set()
-    for series in symbol_intraday_map.values():
-        all_ts.update(series.keys())
+    Combine intraday pct entries (decimal) by minute across symbols using
+    the provided weights. Output entries keep the timestamp in the "date"
+    field for consistency with strategy_metrics schema.
 
-    if not all_ts:
+    Symbols are aligned on the shared grid of every minute any held symbol
+    traded. A symbol with no bar in a grid minute contributes 0: its last
+    price carries forward unchanged, which is a 0% return for that minute.
+    """
+    parts = [
+        (w, symbol_intraday_map[sym])
+        for sym, w in weights.items()
+        if sym in symbol_intraday_map and len(symbol_intraday_map[sym].minute)
+    ]
+    if not parts:
         return []
 
-    def _sort_key(ts: str) -> dt.datetime:
-        try:
-            return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        except Exception:
-            return dt.datetime.min.replace(tzinfo=dt.timezone.utc)
+    grid = np.unique(np.concatenate([series.minute for _, series in parts]))
+    total = np.zeros(len(grid))
+    for w, series in parts:
+        total[np.searchsorted(grid, series.minute)] += w * series.pct
 
-    series: List[Dict[str, Any]] = []
-
-    for ts in sorted(all_ts, key=_sort_key):
-        total_pct = 0.0
-        for sym, w in weights.items():
-            pct_map = symbol_intraday_map.get(sym, {})
-            if ts in pct_map:
-                total_pct += w * pct_map[ts]
-        # store timestamp string under "date" as requested
-        series.append({"date": ts, "pct": float(total_pct)})
-
-    return series
+    # store timestamp string under "date" as requested
+    stamps = (grid.astype("datetime64[m]").astype(str).astype(object) + ":00Z").tolist()
+    return [{"date": ts, "pct": p} for ts, p in zip(stamps, total.tolist())]
 
 
 # ================ STATS HELPERS ===================
@@ -212,124 +622,34 @@ def build_window_series(series_all: List[Dict[str, Any]]) -> Dict[str, List[Dict
     From full series_all (sorted), build all time-window series.
     series_all uses pct in decimal space (0.01 == 1%).
     """
-    if not series_all:
-        return {
-            "series_1d": [],
-            "series_1m": [],
-            "series_3m": [],
-            "series_6m": [],
-            "series_1y": [],
-            "series_3y": [],
-            "series_ytd": [],
-        }
+    return slice_windows(series_all, now_utc().date(), STRATEGY_WINDOW_DAYS)
 
-    today = now_utc().date()
-    one_month_ago = today - dt.timedelta(days=30)
-    three_months_ago = today - dt.timedelta(days=90)
-    six_months_ago = today - dt.timedelta(days=180)
-    one_year_ago = today - dt.timedelta(days=365)
-    three_years_ago = today - dt.timedelta(days=3 * 365)
-    ytd_start = dt.date(today.year, 1, 1)
-
-    def filter_from(date_cutoff: dt.date) -> List[Dict[str, Any]]:
-        cutoff_str = date_cutoff.isoformat()
-        return [e for e in series_all if e.get("date", "") >= cutoff_str]
-
-    series_1d = series_all[-1:]  # last point only
-    series_1m = filter_from(one_month_ago)
-    series_3m = filter_from(three_months_ago)
-    series_6m = filter_from(six_months_ago)
-    series_1y = filter_from(one_year_ago)
-    series_3y = filter_from(three_years_ago)
-    series_ytd = filter_from(ytd_start)
 
-    return {
-        "series_1d": series_1d,
-        "series_1m": series_1m,
-        "series_3m": series_3m,
-        "series_6m": series_6m,
-        "series_1y": series_1y,
-        "series_3y": series_3y,
-        "series_ytd": series_ytd,
-    }
-
-
-def _series_to_date_returns(series_all: List[Dict[str, Any]]) -> List[Tuple[dt.date, float]]:
-    data: List[Tuple[dt.date, float]] = []
-    for e in series_all:
-        if not isinstance(e, dict):
-            continue
-        d_str = e.get("date")
-        pct = e.get("pct")
-        if d_str is None or pct is None:
-            continue
-        try:
-            d = dt.date.fromisoformat(d_str)
-            r = float(pct)  # still decimal
-        except Exception:
-            continue
-        data.append((d, r))
-    data.sort(key=lambda x: x[0])
-    return data
-
-
-def compute_perf_summary(series_all: List[Dict[str, Any]]) -> Dict[str, Any]:
+def compute_perf_summary(
+    series_all: List[Dict[str, Any]],
+    previous_state: Dict[str, Any] | None = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any] | None]:
     """
-    Build perf_summary dict from series_all.
+    Build (perf_summary, perf_state) from series_all (sorted by date).
     All *_pct fields here are in "percent space": 9.0 == 9% not 0.09.
-    """
-    data = _series_to_date_returns(series_all)
-    if not data:
-        return {}
-
-    dates = [d for d, _ in data]
-    rets = [r for _, r in data]  # decimals
-
-    total_days = len(rets)
-
-    # best / worst days
-    best_idx = max(range(total_days), key=lambda i: rets[i])
-    worst_idx = min(range(total_days), key=lambda i: rets[i])
-
-    best_day_pct = rets[best_idx] * 100.0
-    worst_day_pct = rets[worst_idx] * 100.0
-    best_day_date = dates[best_idx].isoformat()
-    worst_day_date = dates[worst_idx].isoformat()
-
-    days_positive = sum(1 for r in rets if r > 0)
-    days_negative = sum(1 for r in rets if r < 0)
 
-    positive_days_pct = (days_positive / total_days) * 100.0
-    negative_days_pct = (days_negative / total_days) * 100.0
+    With INCREMENTAL_PERF_SUMMARY the running statistics are carried over
+    from previous_state, so only days added since the last run are folded
+    in (see perf_accumulator.py); otherwise perf_state is None.
+    """
+    acc = PerfAccumulator.from_state(previous_state if INCREMENTAL_PERF_SUMMARY else None)
+    stats = acc.sync(series_all)
+    state = acc.to_state() if INCREMENTAL_PERF_SUMMARY else None
+    if stats.count == 0:
+        return {}, state
 
-    avg_daily_return_pct = (sum(rets) / total_days) * 100.0
+    summary = stats.summary_fields(now_utc().date())
 
-    # daily vol in percent space
-    if len(rets) > 1:
-        daily_vol_pct = pstdev(rets) * 100.0
-    else:
-        daily_vol_pct = 0.0
-
-    # YTD cumulative return (product of daily returns)
-    today = now_utc().date()
-    ytd_start = dt.date(today.year, 1, 1)
-    ytd_rets = [r for d, r in data if ytd_start <= d <= today]
-
-    if ytd_rets:
-        growth = 1.0
-        for r in ytd_rets:
-            growth *= (1.0 + r)
-        ytd_return_pct = (growth - 1.0) * 100.0
-    else:
-        ytd_return_pct = 0.0
+    # daily vol in percent space (population stdev)
+    daily_vol_pct = stats.stdev(ddof=0) * 100.0
 
     # stability components
-    abs_returns_pct = [abs(r) * 100.0 for r in rets]
-    if abs_returns_pct:
-        abs_returns_pct_sorted = sorted(abs_returns_pct)
-        typical_day_pct = abs_returns_pct_sorted[len(abs_returns_pct_sorted) // 2]
-    else:
-        typical_day_pct = 0.0
+    typical_day_pct = stats.median_abs_pct()
 
     k = 25.0
     # simple stability score: lower vol => higher stability
@@ -345,27 +665,18 @@ def compute_perf_summary(series_all: List[Dict[str, Any]]) -> Dict[str, Any]:
         stability_tier = "Aggressive"
         risk_level = "Aggressive"
 
-    return {
+    summary.update({
         "risk_level": risk_level,
-        "total_days": total_days,
-        "best_day_pct": best_day_pct,
-        "best_day_date": best_day_date,
-        "days_negative": days_negative,
-        "days_positive": days_positive,
-        "worst_day_pct": worst_day_pct,
         "stability_tier": stability_tier,
-        "worst_day_date": worst_day_date,
-        "ytd_return_pct": ytd_return_pct,
-        "negative_days_pct": negative_days_pct,
-        "positive_days_pct": positive_days_pct,
         "stability_numeric": stability_numeric,
-        "avg_daily_return_pct": avg_daily_return_pct,
         "stability_components": {
             "k": k,
-            "worst_day_pct": worst_day_pct,
+            "worst_day_pct": summary["worst_day_pct"],
             "typical_day_pct": typical_day_pct,
         },
-    }
+    })
+
+    return summary, state
 
 
 def build_calendar_returns(series_all: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -379,99 +690,237 @@ def build_calendar_returns(series_all: List[Dict[str, Any]]) -> List[Dict[str, A
     }
     from series_all which is in decimal space.
     """
-    data = _series_to_date_returns(series_all)
-    result: List[Dict[str, Any]] = []
+    return calendar_rows(parse_daily_returns(series_all), PERCENT)
 
-    for d, r in data:
-        result.append({
-            "year": d.year,
-            "month": d.month,
-            "day": d.day,
-            "pct": r * 100.0,  # convert decimal -> percent
-        })
 
-    return result
+# ================ MAIN ENGINE ===================
 
+def strategy_weights_from_holdings(holdings: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Normalised {symbol: weight} from portfolio_holdings; {} if the total weight is not positive."""
+    raw_weights: Dict[str, float] = {}
+    total_weight = 0.0
 
-# ================ MAIN ENGINE ===================
+    for asset in holdings:
+        if not isinstance(asset, dict):
+            continue
+        symbol = asset.get("symbol")
+        w_raw = asset.get("weight_pct", 0.0)
+        try:
+            w = float(w_raw)
+        except (TypeError, ValueError):
+            continue
 
-def update_strategy_metrics_from_universe():
-    print("[INFO] Fetching strategy_metrics rows...")
+        if symbol and w > 0:
+            raw_weights[symbol] = raw_weights.get(symbol, 0.0) + w
+            total_weight += w
 
-    resp = supabase.table("strategy_metrics").select("*").execute()
-    rows = resp.data or []
+    if total_weight <= 0:
+        return {}
 
-    print(f"[INFO] Found {len(rows)} strategies")
+    return {sym: w / total_weight for sym, w in raw_weights.items()}
 
-    today = now_utc().date()
-    default_lookback_start = today - dt.timedelta(days=3 * 365)
 
-    for row in rows:
-        strategy_id = row.get("strategy_id")
-        if not strategy_id:
-            continue
+def prepare_strategy(
+    row: Dict[str, Any],
+    default_lookback_start: dt.date,
+    read_at: dt.datetime | None = None,
+) -> Dict[str, Any] | None:
+    """
+    Validate one strategy_metrics row and derive what evaluation needs:
+    holdings, normalised weights, the sorted existing series_all and the
+    date to reload the universe from (None = full history). `read_at` is
+    when the run started reading the universe; it becomes updated_at, the
+    watermark dirty tracking compares against.
+    """
+    strategy_id = row.get("strategy_id")
+    if not strategy_id:
+        return None
+
+    holdings = row.get("portfolio_holdings") or []
+    if not isinstance(holdings, list) or not holdings:
+        print(f"[INFO] Strategy {strategy_id} has no holdings, skipping")
+        return None
+
+    weights = strategy_weights_from_holdings(holdings)
+    if not weights:
+        print(f"[WARN] Strategy {strategy_id} has non_positive total weight, skipping")
+        return None
+
+    # existing series_all
+    series_all = list(decode_series(row.get("series_all")))
+
+    try:
+        series_all.sort(key=lambda x: x.get("date", ""))
+    except Exception as e:
+        print(f"[WARN] Could not sort existing series_all for {strategy_id}: {e}")
+
+    # last loaded date
+    if series_all:
+        last_date_str = series_all[-1].get("date")
+        try:
+            last_date = dt.date.fromisoformat(last_date_str)
+        except Exception:
+            last_date = default_lookback_start
+    else:
+        last_date = None
 
-        holdings = row.get("portfolio_holdings") or []
-        if not isinstance(holdings, list) or not holdings:
-            print(f"[INFO] Strategy {strategy_id} has no holdings, skipping")
-            continue
+    return {
+        "strategy_id": strategy_id,
+        "holdings": holdings,
+        "weights": weights,
+        "series_all": series_all,
+        "perf_state": row.get("perf_state") if isinstance(row.get("perf_state"), dict) else None,
+        "start_date": last_date if last_date else None,
+        "read_at": read_at,
+    }
 
-        print(f"[INFO] Updating strategy {strategy_id}")
 
-        # build weights from holdings
-        raw_weights: Dict[str, float] = {}
-        total_weight = 0.0
+def load_symbol_maps(
+    symbols: List[str],
+    start_date: dt.date | None,
+    end_date: dt.date,
+) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]:
+    """(daily pct map, intraday pct map) for `symbols` from the configured source."""
+    if USE_BAR_STORE:
+        return (
+            build_symbol_pct_from_bar_store(symbols, start_date, end_date),
+            build_symbol_intraday_from_bar_store(symbols),
+        )
+    return universe_symbol_pct(symbols, start_date, end_date), universe_symbol_intraday(symbols)
 
-        for asset in holdings:
-            if not isinstance(asset, dict):
-                continue
-            symbol = asset.get("symbol")
-            w_raw = asset.get("weight_pct", 0.0)
-            try:
-                w = float(w_raw)
-            except (TypeError, ValueError):
-                continue
 
-            if symbol and w > 0:
-                raw_weights[symbol] = raw_weights.get(symbol, 0.0) + w
-                total_weight += w
+def load_symbol_columns(
+    symbols: List[str],
+    start_date: dt.date | None,
+    end_date: dt.date,
+) -> Tuple[Dict[str, Tuple[np.ndarray, np.ndarray]], Dict[str, IntradayReturns]]:
+    """({symbol: (epoch days, pct)}, intraday map) for the matrix-based paths."""
+    if USE_BAR_STORE:
+        return (
+            daily_columns_from_bar_store(symbols, start_date, end_date),
+            build_symbol_intraday_from_bar_store(symbols),
+        )
+    columns = {
+        sym: daily_columns(sym_map)
+        for sym, sym_map in universe_symbol_pct(symbols, start_date, end_date).items()
+    }
+    return columns, universe_symbol_intraday(symbols)
 
-        if total_weight <= 0:
-            print(f"[WARN] Strategy {strategy_id} has non_positive total weight, skipping")
-            continue
 
-        weights: Dict[str, float] = {sym: w / total_weight for sym, w in raw_weights.items()}
+def latest_symbol_pct(symbol_columns: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, Dict[str, float]]:
+    """{symbol: {latest iso date: pct}}, all build_strategy_payload needs for daily_change_pct."""
+    latest: Dict[str, Dict[str, float]] = {}
+    for sym, (days, pct) in symbol_columns.items():
+        if len(days):
+            i = int(np.argmax(days))
+            latest[sym] = {str(np.datetime64(int(days[i]), "D")): float(pct[i])}
+    return latest
 
-        # existing series_all
-        series_all = row.get("series_all") or []
-        if not isinstance(series_all, list):
-            series_all = []
 
+def build_strategy_payload(
+    strategy: Dict[str, Any],
+    new_series: List[Dict[str, Any]],
+    intraday_series: List[Dict[str, Any]],
+    symbol_pct_map: Dict[str, Dict[str, float]],
+    today: dt.date,
+) -> Dict[str, Any]:
+    """Merge freshly computed points into series_all and derive the full strategy_metrics payload."""
+    strategy_id = strategy["strategy_id"]
+    series_all = strategy["series_all"]
+
+    # merge with existing series_all safely
+    series_map: Dict[str, float] = {}
+
+    for e in series_all:
+        if not isinstance(e, dict):
+            continue
+        d_str = e.get("date")
+        p_raw = e.get("pct")
+        if d_str is None or p_raw is None:
+            continue
         try:
-            series_all.sort(key=lambda x: x.get("date", ""))
-        except Exception as e:
-            print(f"[WARN] Could not sort existing series_all for {strategy_id}: {e}")
+            p = float(p_raw)
+        except (TypeError, ValueError):
+            continue
+        series_map[d_str] = p
 
-        # last loaded date
-        if series_all:
-            last_date_str = series_all[-1].get("date")
-            try:
-                last_date = dt.date.fromisoformat(last_date_str)
-            except Exception:
-                last_date = default_lookback_start
-        else:
-            last_date = None
+    for e in new_series:
+        if not isinstance(e, dict):
+            continue
+        d_str = e.get("date")
+        p_raw = e.get("pct")
+        if d_str is None or p_raw is None:
+            continue
+        try:
+            p = float(p_raw)
+        except (TypeError, ValueError):
+            continue
+        # overwrite for that date (so today's pct gets refreshed)
+        series_map[d_str] = p
+
+    series_all = [
+        {"date": d, "pct": p}
+        for d, p in sorted(series_map.items())
+    ]
+
+    # ===== NEW BIT: portfolio_holdings.daily_change_pct in percent =====
+    # Use latest daily pct per symbol from symbol_pct_map and store as percent (3.0 == 3%).
+    # Only dates inside this strategy's reload window count, since a shared
+    # map may reach further back than this strategy asked for.
+    start_str = strategy["start_date"].isoformat() if strategy["start_date"] else ""
+    updated_holdings: List[Dict[str, Any]] = []
+    for asset in strategy["holdings"]:
+        if not isinstance(asset, dict):
+            continue
+        sym = asset.get("symbol")
+        asset_copy = dict(asset)
+        daily_pct_decimal = 0.0
+        if sym in symbol_pct_map:
+            sym_map = symbol_pct_map[sym]
+            if sym_map:
+                # latest date for this symbol
+                last_sym_date = max(sym_map.keys())
+                if last_sym_date >= start_str:
+                    daily_pct_decimal = sym_map[last_sym_date]
+        # convert decimal → percent
+        asset_copy["daily_change_pct"] = daily_pct_decimal * 100.0
+        updated_holdings.append(asset_copy)
+    # ===================================================================
 
-        start_date = last_date if last_date else None
-        end_date = today
+    # derive windows, perf_summary, calendar_returns
+    windows = build_window_series(series_all)
+    perf_summary, perf_state = compute_perf_summary(series_all, strategy["perf_state"])
+    calendar_returns = build_calendar_returns(series_all)
 
-        symbol_pct_map = build_symbol_pct_from_universe(
-            symbols=list(weights.keys()),
-            start_date=start_date,
-            end_date=end_date,
-        )
+    print(f"[INFO] Strategy {strategy_id} evaluated. series_all length: {len(series_all)}")
 
-        symbol_intraday_map = build_symbol_intraday_from_universe(list(weights.keys()))
+    return {
+        "strategy_id": strategy_id,
+        "series_all": encode_for_storage(series_all),
+        # override 1d with intraday history when available, otherwise keep last daily point
+        "series_1d": encode_for_storage(intraday_series if intraday_series else windows["series_1d"]),
+        **window_columns(series_all, windows),
+        "perf_summary": perf_summary,
+        **({"perf_state": perf_state} if perf_state is not None else {}),
+        "calendar_returns": calendar_returns,
+        "portfolio_holdings": updated_holdings,  # updated with daily_change_pct as percent
+        "asof_date": today.isoformat(),
+        "updated_at": (strategy.get("read_at") or now_utc()).isoformat(),
+    }
+
+
+def evaluate_strategies_sequential(strategies: List[Dict[str, Any]], today: dt.date) -> List[Dict[str, Any]]:
+    """Original per-strategy path: one universe read and one weighted walk per strategy."""
+    payloads: List[Dict[str, Any]] = []
+
+    for strategy in strategies:
+        strategy_id = strategy["strategy_id"]
+        weights = strategy["weights"]
+        print(f"[INFO] Updating strategy {strategy_id}")
+
+        symbol_pct_map, symbol_intraday_map = load_symbol_maps(
+            list(weights.keys()), strategy["start_date"], today
+        )
 
         new_series = compute_weighted_daily_series_from_universe(weights, symbol_pct_map)
         print(f"[INFO] Strategy {strategy_id}: {len(new_series)} new daily points from universe")
@@ -484,98 +933,491 @@ def update_strategy_metrics_from_universe():
                 f"[INFO] Strategy {strategy_id}: {len(intraday_series)} intraday points from universe"
             )
 
-        # merge with existing series_all safely
-        series_map: Dict[str, float] = {}
+        payloads.append(build_strategy_payload(strategy, new_series, intraday_series, symbol_pct_map, today))
 
-        for e in series_all:
-            if not isinstance(e, dict):
-                continue
-            d_str = e.get("date")
-            p_raw = e.get("pct")
-            if d_str is None or p_raw is None:
-                continue
-            try:
-                p = float(p_raw)
-            except (TypeError, ValueError):
-                continue
-            series_map[d_str] = p
+    return payloads
 
-        for e in new_series:
-            if not isinstance(e, dict):
-                continue
-            d_str = e.get("date")
-            p_raw = e.get("pct")
-            if d_str is None or p_raw is None:
-                continue
-            try:
-                p = float(p_raw)
-            except (TypeError, ValueError):
-                continue
-            # overwrite for that date (so today's pct gets refreshed)
-            series_map[d_str] = p
 
-        series_all = [
+def build_return_matrix(
+    symbols: List[str],
+    symbol_columns: Dict[str, Tuple[np.ndarray, np.ndarray]],
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    (dates, returns, present): the sorted union of dates (ISO strings), a
+    dates x symbols matrix of daily pct (0.0 where missing) and the matching
+    presence mask, filled column by column from (epoch days, pct) arrays.
+    """
+    day_arrays = [np.asarray(symbol_columns[sym][0], dtype=np.int64) for sym in symbols if sym in symbol_columns]
+    all_days = np.unique(np.concatenate(day_arrays)) if day_arrays else np.empty(0, dtype=np.int64)
+
+    returns = np.zeros((len(all_days), len(symbols)))
+    present = np.zeros((len(all_days), len(symbols)), dtype=bool)
+    for j, sym in enumerate(symbols):
+        if sym not in symbol_columns:
+            continue
+        days, pct = symbol_columns[sym]
+        rows = np.searchsorted(all_days, days)
+        returns[rows, j] = pct
+        present[rows, j] = True
+
+    return all_days.astype("datetime64[D]").astype(str).tolist(), returns, present
+
+
+def compute_weighted_daily_series_batch(
+    strategies: List[Dict[str, Any]],
+    symbol_columns: Dict[str, Tuple[np.ndarray, np.ndarray]],
+) -> List[List[Dict[str, Any]]]:
+    """
+    Daily series for many strategies at once.
+
+    Builds one dates x symbols return matrix R over the union of held
+    symbols and a symbols x strategies weight matrix W, so every
+    strategy's weighted pct is a column of R @ W. A strategy gets a point
+    on a date when at least one of its symbols has data that day and the
+    date is on/after its start_date, matching
+    compute_weighted_daily_series_from_universe.
+    """
+    symbols = sorted({sym for s in strategies for sym in s["weights"]})
+    sym_idx = {sym: j for j, sym in enumerate(symbols)}
+
+    all_dates, returns, present = build_return_matrix(symbols, symbol_columns)
+    if not all_dates:
+        return [[] for _ in strategies]
+
+    weights = np.zeros((len(symbols), len(strategies)))
+    for k, strategy in enumerate(strategies):
+        for sym, w in strategy["weights"].items():
+            weights[sym_idx[sym], k] = w
+
+    portfolio = returns @ weights
+    held_present = present.astype(np.float64) @ (weights > 0).astype(np.float64)
+
+    dates_arr = np.asarray(all_dates)
+    out: List[List[Dict[str, Any]]] = []
+    for k, strategy in enumerate(strategies):
+        mask = held_present[:, k] > 0
+        if strategy["start_date"] is not None:
+            mask &= dates_arr >= strategy["start_date"].isoformat()
+        out.append([
             {"date": d, "pct": p}
-            for d, p in sorted(series_map.items())
+            for d, p in zip(dates_arr[mask].tolist(), portfolio[mask, k].tolist())
+        ])
+    return out
+
+
+def evaluate_strategies_batch(strategies: List[Dict[str, Any]], today: dt.date) -> List[Dict[str, Any]]:
+    """
+    Batch path: one universe read for the union of held symbols, then a
+    single matrix product for all strategies' daily series.
+    """
+    if not strategies:
+        return []
+
+    symbols = sorted({sym for s in strategies for sym in s["weights"]})
+    starts = [s["start_date"] for s in strategies]
+    union_start = None if None in starts else min(starts)
+
+    print(f"[INFO] Batch-evaluating {len(strategies)} strategies over {len(symbols)} symbols")
+
+    symbol_columns, symbol_intraday_map = load_symbol_columns(symbols, union_start, today)
+    daily_series = compute_weighted_daily_series_batch(strategies, symbol_columns)
+    symbol_pct_map = latest_symbol_pct(symbol_columns)
+
+    payloads: List[Dict[str, Any]] = []
+    for strategy, new_series in zip(strategies, daily_series):
+        weights = strategy["weights"]
+        own_intraday = {sym: symbol_intraday_map[sym] for sym in weights if sym in symbol_intraday_map}
+        intraday_series = compute_weighted_intraday_series_from_universe(weights, own_intraday)
+
+        payloads.append(build_strategy_payload(strategy, new_series, intraday_series, symbol_pct_map, today))
+
+    return payloads
+
+
+# ================ PARALLEL EVALUATION ===================
+
+# Per-worker inputs, filled in by _init_evaluation_worker
+_worker_inputs: Dict[str, Any] = {}
+
+
+def _share_array(arr: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple[str, Tuple[int, ...], str]]:
+    """Copy `arr` into a new shared-memory block; returns (block, spec to attach with)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach_array(spec: Tuple[str, Tuple[int, ...], str]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _init_evaluation_worker(
+    dates: List[str],
+    symbols: List[str],
+    returns_spec: Tuple[str, Tuple[int, ...], str],
+    present_spec: Tuple[str, Tuple[int, ...], str],
+    symbol_intraday_map: Dict[str, IntradayReturns],
+    today: dt.date,
+) -> None:
+    returns_shm, returns = _attach_array(returns_spec)
+    present_shm, present = _attach_array(present_spec)
+    _worker_inputs.update({
+        "dates": np.asarray(dates),
+        "sym_idx": {sym: j for j, sym in enumerate(symbols)},
+        "returns": returns,
+        "present": present,
+        # keep the blocks mapped for the lifetime of the worker
+        "shm": (returns_shm, present_shm),
+        "intraday": symbol_intraday_map,
+        "today": today,
+    })
+
+
+def _evaluate_strategy_in_worker(strategy: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate one strategy from the shared return matrix (runs in a pool worker)."""
+    inputs = _worker_inputs
+    weights = strategy["weights"]
+    dates = inputs["dates"]
+    returns = inputs["returns"]
+    present = inputs["present"]
+    sym_idx = inputs["sym_idx"]
+
+    w_full = np.zeros(returns.shape[1])
+    held_cols = []
+    for sym, w in weights.items():
+        w_full[sym_idx[sym]] = w
+        if w > 0:
+            held_cols.append(sym_idx[sym])
+
+    new_series: List[Dict[str, Any]] = []
+    symbol_pct_map: Dict[str, Dict[str, float]] = {}
+    if len(dates):
+        mask = present[:, held_cols].any(axis=1)
+        if strategy["start_date"] is not None:
+            mask &= dates >= strategy["start_date"].isoformat()
+        portfolio = returns @ w_full
+        new_series = [
+            {"date": d, "pct": p}
+            for d, p in zip(dates[mask].tolist(), portfolio[mask].tolist())
         ]
 
-        # ===== NEW BIT: portfolio_holdings.daily_change_pct in percent =====
-        # Use latest daily pct per symbol from symbol_pct_map and store as percent (3.0 == 3%)
-        updated_holdings: List[Dict[str, Any]] = []
-        for asset in holdings:
-            if not isinstance(asset, dict):
-                continue
-            sym = asset.get("symbol")
-            asset_copy = dict(asset)
-            daily_pct_decimal = 0.0
-            if sym in symbol_pct_map:
-                sym_map = symbol_pct_map[sym]
-                if sym_map:
-                    # latest date for this symbol
-                    last_sym_date = max(sym_map.keys())
-                    daily_pct_decimal = sym_map[last_sym_date]
-            # convert decimal → percent
-            asset_copy["daily_change_pct"] = daily_pct_decimal * 100.0
-            updated_holdings.append(asset_copy)
-        # ===================================================================
-
-        # derive windows, perf_summary, calendar_returns
-        windows = build_window_series(series_all)
-        perf_summary = compute_perf_summary(series_all)
-        calendar_returns = build_calendar_returns(series_all)
-
-        update_payload = {
-            "series_all": series_all,
-            # override 1d with intraday history when available, otherwise keep last daily point
-            "series_1d": intraday_series if intraday_series else windows["series_1d"],
-            "series_1m": windows["series_1m"],
-            "series_3m": windows["series_3m"],
-            "series_6m": windows["series_6m"],
-            "series_1y": windows["series_1y"],
-            "series_3y": windows["series_3y"],
-            "series_ytd": windows["series_ytd"],
-            "perf_summary": perf_summary,
-            "calendar_returns": calendar_returns,
-            "portfolio_holdings": updated_holdings,  # updated with daily_change_pct as percent
-            "asof_date": today.isoformat(),
-            "updated_at": now_utc().isoformat(),
+        # only each symbol's latest point is needed for holdings' daily_change_pct
+        for sym in weights:
+            rows = np.flatnonzero(present[:, sym_idx[sym]])
+            if len(rows):
+                last = rows[-1]
+                symbol_pct_map[sym] = {str(dates[last]): float(returns[last, sym_idx[sym]])}
+
+    own_intraday = {sym: inputs["intraday"][sym] for sym in weights if sym in inputs["intraday"]}
+    intraday_series = compute_weighted_intraday_series_from_universe(weights, own_intraday)
+
+    return build_strategy_payload(strategy, new_series, intraday_series, symbol_pct_map, inputs["today"])
+
+
+class EvaluationPool:
+    """
+    Worker processes for one engine run. The return matrix over every
+    symbol the run's strategies hold (full history; each strategy's
+    start_date is applied as a mask) is built and placed in shared memory
+    once, workers attach to it at start-up, and each page's strategies are
+    then handed out as task arguments. Strategies holding a symbol outside
+    the matrix (holdings edited since the index was read) are evaluated
+    in-process.
+    """
+
+    def __init__(self, symbols: List[str], today: dt.date, workers: int):
+        self.symbols = sorted(set(symbols))
+        self.today = today
+        self.workers = workers
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self._pool: ProcessPoolExecutor | None = None
+
+        print(f"[INFO] Starting {workers} evaluation workers over {len(self.symbols)} symbols")
+
+        symbol_columns, symbol_intraday_map = load_symbol_columns(self.symbols, None, today)
+        dates, returns, present = build_return_matrix(self.symbols, symbol_columns)
+
+        try:
+            returns_shm, returns_spec = _share_array(returns)
+            self._blocks.append(returns_shm)
+            present_shm, present_spec = _share_array(present)
+            self._blocks.append(present_shm)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_evaluation_worker,
+                initargs=(dates, self.symbols, returns_spec, present_spec, symbol_intraday_map, today),
+            )
+        except BaseException:
+            self.close()
+            raise
+
+    def evaluate(self, strategies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Payloads for `strategies`, in input order regardless of scheduling."""
+        known = set(self.symbols)
+        inside = [s for s in strategies if known.issuperset(s["weights"])]
+        outside = [s for s in strategies if not known.issuperset(s["weights"])]
+
+        print(
+            f"[INFO] Evaluating {len(inside)} strategies with {self.workers} worker processes"
+            + (f", {len(outside)} in-process" if outside else "")
+        )
+
+        chunksize = max(1, len(inside) // (self.workers * 4))
+        by_id = {
+            payload["strategy_id"]: payload
+            for payload in self._pool.map(_evaluate_strategy_in_worker, inside, chunksize=chunksize)
         }
+        by_id.update((payload["strategy_id"], payload) for payload in evaluate_strategies_batch(outside, self.today))
+        return [by_id[s["strategy_id"]] for s in strategies]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self) -> "EvaluationPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def evaluate_strategies_parallel(
+    strategies: List[Dict[str, Any]],
+    today: dt.date,
+    workers: int = EVALUATION_WORKERS,
+) -> List[Dict[str, Any]]:
+    """One-off EvaluationPool over exactly these strategies' symbols."""
+    if not strategies:
+        return []
+
+    with EvaluationPool(sorted({sym for s in strategies for sym in s["weights"]}), today, workers) as pool:
+        return pool.evaluate(strategies)
 
-        supabase.table("strategy_metrics").update(update_payload).eq("strategy_id", strategy_id).execute()
-        print(f"[INFO] Strategy {strategy_id} updated. series_all length: {len(series_all)}")
 
+# ================ DIRTY TRACKING ===================
+
+# strategy_id -> weights this process last evaluated the strategy with
+_evaluated_weights: Dict[str, Dict[str, float]] = {}
+
+# strategy_id -> read_at of the last evaluation that produced no write; it
+# stands in for updated_at, which only advances when the row is written
+_evaluated_at: Dict[str, dt.datetime] = {}
+
+
+def load_universe_watermarks(symbols: List[str]) -> Dict[str, dt.datetime]:
+    """{symbol: trading_universe.last_updated_at} for the given symbols."""
+    watermarks: Dict[str, dt.datetime] = {}
+    for i in range(0, len(symbols), SYMBOL_CACHE_FETCH_CHUNK):
+        chunk = symbols[i:i + SYMBOL_CACHE_FETCH_CHUNK]
+        resp = (
+            supabase.table("trading_universe")
+            .select("symbol, last_updated_at")
+            .in_("symbol", chunk)
+            .execute()
+        )
+        for row in resp.data or []:
+            ts = _parse_timestamp(row.get("last_updated_at"))
+            if row.get("symbol") and ts is not None:
+                watermarks[row["symbol"]] = ts
+    return watermarks
+
+
+def select_dirty_strategies(
+    index: List[Dict[str, Any]],
+    watermarks: Dict[str, dt.datetime],
+    today: dt.date,
+    stats: Dict[str, int],
+    changed_symbols: Set[str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Index entries that need recomputing; the reason for each (and the
+    number skipped) is counted into `stats`. When the caller already knows
+    which symbols changed (pipeline mode), `changed_symbols` replaces the
+    last_updated_at watermark comparison.
+    """
+    grace = dt.timedelta(seconds=DIRTY_TRACKING_GRACE_SECONDS)
+    dirty: List[Dict[str, Any]] = []
+
+    for entry in index:
+        evaluated_at = _evaluated_at.get(entry["strategy_id"])
+        if evaluated_at is not None and (entry["updated_at"] is None or evaluated_at > entry["updated_at"]):
+            entry = {**entry, "updated_at": evaluated_at}
+
+        if not entry["weights"]:
+            reason = None
+        elif entry["updated_at"] is None:
+            reason = "never_evaluated"
+        elif entry["asof_date"] != today.isoformat():
+            reason = "new_day"
+        elif entry["strategy_id"] not in _evaluated_weights:
+            reason = "first_seen"
+        elif _evaluated_weights[entry["strategy_id"]] != entry["weights"]:
+            reason = "holdings_changed"
+        elif changed_symbols is not None:
+            reason = "new_symbol_data" if not changed_symbols.isdisjoint(entry["weights"]) else None
+        elif any(
+            watermarks.get(sym) is not None and watermarks[sym] > entry["updated_at"] - grace
+            for sym in entry["weights"]
+        ):
+            reason = "new_symbol_data"
+        else:
+            reason = None
+
+        if reason is None:
+            stats["skipped"] += 1
+        else:
+            stats[reason] += 1
+            dirty.append(entry)
+
+    return dirty
+
+
+def iter_strategy_pages(strategy_ids: List[str] | None):
+    """Full strategy_metrics rows, either every row or only `strategy_ids`."""
+    if strategy_ids is None:
+        yield from iter_pages(supabase, "strategy_metrics", STRATEGY_COLUMNS, key="strategy_id", page_size=READ_PAGE_SIZE)
+        return
+
+    for i in range(0, len(strategy_ids), READ_PAGE_SIZE):
+        chunk = strategy_ids[i:i + READ_PAGE_SIZE]
+        yield from iter_pages(
+            supabase,
+            "strategy_metrics",
+            STRATEGY_COLUMNS,
+            key="strategy_id",
+            page_size=READ_PAGE_SIZE,
+            filters=[("in_", "strategy_id", chunk)],
+        )
+
+
+def update_strategy_metrics_from_universe(
+    batch: bool = BATCH_EVALUATION,
+    dirty_tracking: bool = DIRTY_TRACKING,
+    workers: int = EVALUATION_WORKERS,
+    changed_symbols: Set[str] | None = None,
+) -> Set[str]:
+    """
+    Recompute strategy_metrics from trading_universe. `changed_symbols`
+    (from the universe stage in pipeline mode) narrows dirty tracking to
+    strategies holding those symbols. Returns the strategy ids written.
+    """
+    print("[INFO] Fetching strategy_metrics rows...")
+
+    seen = 0
+    read_at = now_utc()
+    today = read_at.date()
+    default_lookback_start = today - dt.timedelta(days=3 * 365)
+
+    writer = BulkUpsertWriter(
+        supabase,
+        "strategy_metrics",
+        key="strategy_id",
+        batch_size=WRITE_BATCH_SIZE,
+        fingerprints=strategy_fingerprints if PARTIAL_WRITES else None,
+        required_columns=STRATEGY_REQUIRED_COLUMNS,
+    )
+    use_cache = USE_SYMBOL_CACHE
+
+    if use_cache and SYMBOL_CACHE_TTL_SECONDS is None:
+        symbol_cache.clear()
+
+    stats: Dict[str, int] = {
+        "skipped": 0,
+        "never_evaluated": 0,
+        "new_day": 0,
+        "first_seen": 0,
+        "holdings_changed": 0,
+        "new_symbol_data": 0,
+    }
+
+    strategy_ids = None
+    index: List[Dict[str, Any]] = []
+    if dirty_tracking or use_cache or workers > 1:
+        index = load_strategy_index()
+        if dirty_tracking:
+            watermarks = {} if changed_symbols is not None else load_universe_watermarks(held_symbols(index))
+            total = len(index)
+            index = select_dirty_strategies(index, watermarks, today, stats, changed_symbols)
+            strategy_ids = [entry["strategy_id"] for entry in index]
+            print(
+                f"[INFO] Dirty tracking: recomputing {len(index)} of {total} strategies "
+                f"(new data {stats['new_symbol_data']}, new day {stats['new_day']}, "
+                f"holdings changed {stats['holdings_changed']}, first seen {stats['first_seen']}, "
+                f"never evaluated {stats['never_evaluated']}), "
+                f"skipped {stats['skipped']}"
+            )
+            if use_cache:
+                symbol_cache.invalidate_updated(watermarks)
+                symbol_cache.invalidate(changed_symbols or ())
+        if use_cache:
+            # with the bar store, the cache only backs symbols it does not hold
+            symbols = held_symbols(index)
+            if USE_BAR_STORE:
+                symbols = [s for s in symbols if not bar_store.has_daily(s)]
+            symbol_cache.prefetch(symbols)
+
+    # one pool per run, and only when this run has enough work to repay it
+    pool = None
+    if workers > 1 and len(index) >= PARALLEL_MIN_STRATEGIES:
+        pool = EvaluationPool(held_symbols(index), today, workers)
+
+    def evaluate(strategies: List[Dict[str, Any]]) -> None:
+        if pool is not None:
+            payloads = pool.evaluate(strategies)
+        elif batch:
+            payloads = evaluate_strategies_batch(strategies, today)
+        else:
+            payloads = evaluate_strategies_sequential(strategies, today)
+
+        for payload in payloads:
+            if writer.add(payload):
+                written.add(payload["strategy_id"])
+            else:
+                _evaluated_at[payload["strategy_id"]] = read_at
+
+        for strategy in strategies:
+            _evaluated_weights[strategy["strategy_id"]] = strategy["weights"]
+
+    written: Set[str] = set()
+    try:
+        for rows in iter_strategy_pages(strategy_ids):
+            seen += len(rows)
+            if PARTIAL_WRITES:
+                for r in rows:
+                    if r.get("strategy_id"):
+                        strategy_fingerprints.seed(r["strategy_id"], r, "strategy_id")
+            strategies = [s for s in (prepare_strategy(r, default_lookback_start, read_at) for r in rows) if s]
+
+            evaluate(strategies)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    writer.flush()
+    writer.report()
+
+    print(f"[INFO] Scanned {seen} strategies, skipped {stats['skipped']} unchanged")
     print("[INFO] Done updating strategy_metrics from trading_universe.")
 
+    return written
+
 
 # ================== SCHEDULER LOOP =====================
 
 if __name__ == "__main__":
-    print("[ENGINE] Strategy metrics engine started — running every 20 minutes.")
-    while True:
-        try:
-            print(f"\n[ENGINE] Run at {now_utc().isoformat()}")
-            update_strategy_metrics_from_universe()
-        except Exception as e:
-            print(f"[ERROR] Strategy engine run failed: {e}")
-        # sleep 20 minutes
-        time.sleep(1200)
+    print(
+        "[ENGINE] Strategy metrics engine started — every "
+        f"{INTRADAY_INTERVAL_SECONDS // 60} minutes during the NYSE session, plus a post-close settlement pass."
+    )
+    run_market_scheduler(
+        lambda phase: update_strategy_metrics_from_universe(),
+        "Strategy engine",
+        INTRADAY_INTERVAL_SECONDS,
+    )
@@ -1,9 +1,17 @@
 import os
-import time
+import threading
 import datetime as dt
-import requests
+from typing import Set
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 
+from bar_store import BarStore
+from market_calendar import PHASE_SETTLEMENT, run_market_scheduler
+from market_data import AlpacaMarketDataClient
+from series_codec import decode_series, encode_for_storage
+from supabase_reader import iter_pages, iter_rows
+from supabase_writer import BulkUpsertWriter, FieldFingerprints
+
 # ==========================
 # CONFIG
 # ==========================
@@ -17,6 +25,8 @@ ALPACA_DATA_URL = "https://data.alpaca.markets/v2"
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+market_data = AlpacaMarketDataClient(ALPACA_API_KEY, ALPACA_SECRET_KEY, data_url=ALPACA_DATA_URL)
+
 
 def now_utc():
     return dt.datetime.now(dt.timezone.utc)
@@ -25,46 +35,128 @@ def now_utc():
 LOOKBACK_DAYS = 365 * 3
 INTRADAY_LOOKBACK_HOURS = 24
 
-
-def get_bars_last_3_years(symbol: str):
-    """Get daily bars for roughly the last 3 years for one symbol."""
+# Batched mode: group symbols into multi-symbol /v2/stocks/bars requests
+BATCHED_FETCH = True
+SYMBOLS_PER_REQUEST = 100
+
+# Incremental mode: only fetch from the last stored date in closes_30d,
+# re-reading a few trailing days to pick up late corrections. A full
+# LOOKBACK_DAYS re-sync runs on start-up and then on the post-close
+# settlement pass, at most once every FULL_RESYNC_INTERVAL_SECONDS.
+INCREMENTAL_OVERLAP_DAYS = 5
+FULL_RESYNC_INTERVAL_SECONDS = 20 * 60 * 60
+
+# Refresh cadence while the NYSE session is open (see market_calendar.py)
+INTRADAY_INTERVAL_SECONDS = 600
+
+# Demand-driven mode: on incremental runs, symbols held by some strategy
+# (strategy_metrics.portfolio_holdings) refresh every run; the rest only
+# once their last_updated_at is older than BACKGROUND_REFRESH_SECONDS.
+# Full re-syncs always cover every row.
+DEMAND_DRIVEN = True
+BACKGROUND_REFRESH_SECONDS = 6 * 60 * 60
+
+# Pipeline mode: overlap fetches, merges and writes on bounded thread pools.
+# Keep PIPELINE_CONCURRENCY at or below the market-data client's pool size.
+PIPELINED = True
+PIPELINE_CONCURRENCY = 8
+WRITE_CONCURRENCY = 4
+MAX_PENDING_WRITES = 32
+
+# Row updates are flushed to trading_universe as bulk upserts of this size
+WRITE_BATCH_SIZE = 100
+
+# trading_universe is streamed in pages of this many rows (see supabase_reader.py)
+READ_PAGE_SIZE = 200
+UNIVERSE_COLUMNS = "id, symbol, currency, data_source, closes_30d, intraday, last_updated_at"
+
+# Copied from the source row into each upsert so the insert half of the
+# upsert satisfies the table's NOT NULL constraints (the columns the admin
+# page sets when it creates a symbol).
+UNIVERSE_IDENTITY_COLUMNS = ("id", "symbol", "currency", "data_source")
+
+# Write a row (and advance its last_updated_at) only when closes_30d or
+# intraday differ from what was read, so the engines' dirty tracking sees
+# data changes rather than every refresh (see FieldFingerprints in
+# supabase_writer.py). The demand-driven background cadence uses the
+# refresh times this process records instead.
+PARTIAL_WRITES = True
+
+# Local columnar bar warehouse (see bar_store.py). When enabled, fetched bars
+# are appended to it on every run; minute partitions older than the
+# retention are pruned on full re-syncs. The start-up full re-sync fills it
+# with the whole LOOKBACK_DAYS window, and the strategies engine reads it
+# (USE_BAR_STORE) when it runs on the same host, e.g. under pipeline.py.
+BAR_STORE_ENABLED = True
+BAR_STORE_MINUTE_RETENTION_DAYS = 30
+
+bar_store = BarStore()
+universe_fingerprints = FieldFingerprints(touch_columns=("last_updated_at",))
+
+# symbol -> when this process last refreshed it, written or not
+_refreshed_at = {}
+
+
+def daily_watermark(row):
+    """Return the last stored date in the row's closes_30d, or None."""
+    closes = row.get("closes_30d") or []
+    if not isinstance(closes, list):
+        return None
+
+    dates = [e.get("date") for e in closes if isinstance(e, dict) and e.get("date")]
+    if not dates:
+        return None
+
+    try:
+        return dt.date.fromisoformat(max(dates))
+    except ValueError:
+        return None
+
+
+def incremental_start_date(watermark):
+    """Start date for an incremental fetch, or None for the full lookback window."""
+    if watermark is None:
+        return None
+    return watermark - dt.timedelta(days=INCREMENTAL_OVERLAP_DAYS)
+
+
+def _daily_range_iso(since: dt.date | None = None):
     end_dt = now_utc() + dt.timedelta(days=1)
     start_dt = end_dt - dt.timedelta(days=LOOKBACK_DAYS)
 
+    if since is not None:
+        since_dt = dt.datetime(since.year, since.month, since.day, tzinfo=dt.timezone.utc)
+        start_dt = max(start_dt, since_dt)
+
     start_iso = start_dt.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
     end_iso = end_dt.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
+    return start_iso, end_iso
 
-    url = f"{ALPACA_DATA_URL}/stocks/bars"
-
-    params = {
-        "symbols": symbol,
-        "timeframe": "1D",
-        "start": start_iso,
-        "end": end_iso,
-        "limit": 1000,
-        "adjustment": "raw",
-        "feed": "iex",
-        "sort": "asc",
-    }
 
-    headers = {
-        "accept": "application/json",
-        "APCA-API-KEY-ID": ALPACA_API_KEY,
-        "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-    }
+def _intraday_range_iso():
+    end_dt = now_utc()
+    start_dt = end_dt - dt.timedelta(hours=INTRADAY_LOOKBACK_HOURS)
 
-    resp = requests.get(url, params=params, headers=headers)
+    start_iso = start_dt.replace(second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
+    end_iso = end_dt.replace(second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
+    return start_iso, end_iso
 
-    if resp.status_code != 200:
-        print(f"[WARN] Failed to fetch bars for {symbol}: {resp.status_code} {resp.text}")
-        return []
 
-    data = resp.json()
-    bars_by_symbol = data.get("bars", {})
-    bars = bars_by_symbol.get(symbol, [])
+def get_bars_last_3_years(symbol: str, since: dt.date | None = None):
+    """
+    Get daily bars for roughly the last 3 years for one symbol.
+    When `since` is given, only bars from that date onward are requested.
+    """
+    start_iso, end_iso = _daily_range_iso(since)
+
+    try:
+        bars = market_data.get_bars([symbol], "1D", start_iso, end_iso).get(symbol, [])
+    except RuntimeError as e:
+        print(f"[WARN] Failed to fetch bars for {symbol}: {e}")
+        return []
 
     if not bars:
-        print(f"[WARN] No bars returned for {symbol} in last {LOOKBACK_DAYS} days")
+        print(f"[WARN] No bars returned for {symbol} since {start_iso}")
         return []
 
     return bars
@@ -72,41 +164,14 @@ def get_bars_last_3_years(symbol: str):
 
 def get_intraday_bars(symbol: str):
     """Get 1-minute bars for the configured intraday lookback window."""
-    end_dt = now_utc()
-    start_dt = end_dt - dt.timedelta(hours=INTRADAY_LOOKBACK_HOURS)
+    start_iso, end_iso = _intraday_range_iso()
 
-    start_iso = start_dt.replace(second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
-    end_iso = end_dt.replace(second=0, microsecond=0).isoformat(timespec="seconds").replace("+00:00", "Z")
-
-    url = f"{ALPACA_DATA_URL}/stocks/bars"
-
-    params = {
-        "symbols": symbol,
-        "timeframe": "1Min",
-        "start": start_iso,
-        "end": end_iso,
-        "limit": 10000,
-        "adjustment": "raw",
-        "feed": "iex",
-        "sort": "asc",
-    }
-
-    headers = {
-        "accept": "application/json",
-        "APCA-API-KEY-ID": ALPACA_API_KEY,
-        "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-    }
-
-    resp = requests.get(url, params=params, headers=headers)
-
-    if resp.status_code != 200:
-        print(f"[WARN] Failed to fetch intraday bars for {symbol}: {resp.status_code} {resp.text}")
+    try:
+        bars = market_data.get_bars([symbol], "1Min", start_iso, end_iso).get(symbol, [])
+    except RuntimeError as e:
+        print(f"[WARN] Failed to fetch intraday bars for {symbol}: {e}")
         return []
 
-    data = resp.json()
-    bars_by_symbol = data.get("bars", {})
-    bars = bars_by_symbol.get(symbol, [])
-
     if not bars:
         print(f"[WARN] No intraday bars returned for {symbol} in last {INTRADAY_LOOKBACK_HOURS} hours")
         return []
@@ -114,116 +179,419 @@ def get_intraday_bars(symbol: str):
     return bars
 
 
-def update_trading_universe_closes_3y():
-    print("[INFO] Fetching trading_universe rows...")
+def get_bars_multi(symbols, timeframe: str, start_iso: str, end_iso: str):
+    """
+    Get bars for many symbols with one paginated /v2/stocks/bars query.
+    Returns { symbol: [bar, ...] }, or {} if the request ultimately failed.
+    """
+    try:
+        return market_data.get_bars(symbols, timeframe, start_iso, end_iso)
+    except RuntimeError as e:
+        print(f"[WARN] Failed to fetch {timeframe} bars for {len(symbols)} symbols: {e}")
+        return {}
+
+
+def store_bars(symbol: str, daily_bars, intraday_bars, full_resync: bool):
+    """Append fetched bars to the local bar store (no-op when disabled)."""
+    if not BAR_STORE_ENABLED:
+        return
+    try:
+        bar_store.append_daily(symbol, daily_bars)
+        bar_store.append_minutes(symbol, intraday_bars)
+        if full_resync:
+            keep_from = now_utc().date() - dt.timedelta(days=BAR_STORE_MINUTE_RETENTION_DAYS)
+            bar_store.prune_minutes(symbol, keep_from)
+    except OSError as e:
+        print(f"[WARN] Could not write {symbol} to bar store: {e}")
+
+
+def merge_daily_closes(row, bars):
+    """Merge daily bars into the row's closes_30d and return the trimmed, sorted list."""
+    closes = row.get("closes_30d") or []
+    if not isinstance(closes, list):
+        closes = []
+
+    # Convert to dict for fast overwrite: date -> entry
+    closes_by_date = {e.get("date"): e for e in closes if isinstance(e, dict) and "date" in e}
+
+    for bar in bars:
+        t = bar.get("t")
+        o = bar.get("o")
+        c = bar.get("c")
+
+        if t is None or o is None or c is None:
+            continue
 
-    resp = supabase.table("trading_universe").select("*").execute()
-    rows = resp.data or []
+        date_str = t[:10]
 
-    print(f"[INFO] Found {len(rows)} instruments")
+        # compute pct
+        pct = 0.0 if o == 0 else (c - o) / o
 
-    for row in rows:
-        symbol = row.get("symbol")
-        if not symbol:
-            continue
+        # ALWAYS overwrite today's value (or any day's)
+        closes_by_date[date_str] = {
+            "pct": float(pct),
+            "date": date_str
+        }
 
-        print(f"[INFO] Updating {symbol}...")
+    # Convert dict back to list
+    closes = list(closes_by_date.values())
 
-        bars = get_bars_last_3_years(symbol)
-        if not bars:
-            print(f"[INFO] Skipping {symbol}, no bars in range")
+    # Only keep the configured lookback window
+    cutoff_date = (now_utc().date() - dt.timedelta(days=LOOKBACK_DAYS)).isoformat()
+    closes = [e for e in closes if e.get("date", "") >= cutoff_date]
+
+    # Sort
+    closes.sort(key=lambda x: x.get("date", ""))
+
+    return closes
+
+
+def merge_intraday(row, intraday_bars):
+    """Merge 1-minute bars into the row's intraday list and return the trimmed, sorted list."""
+    intraday = row.get("intraday") or []
+    if not isinstance(intraday, list):
+        intraday = []
+
+    intraday_by_ts = {e.get("ts"): e for e in intraday if isinstance(e, dict) and "ts" in e}
+
+    for bar in intraday_bars:
+        t = bar.get("t")
+        o = bar.get("o")
+        c = bar.get("c")
+
+        if t is None or o is None or c is None:
             continue
 
-        closes = row.get("closes_30d") or []
-        if not isinstance(closes, list):
-            closes = []
+        pct = 0.0 if o == 0 else (c - o) / o
 
-        # Convert to dict for fast overwrite: date -> entry
-        closes_by_date = {e.get("date"): e for e in closes if isinstance(e, dict) and "date" in e}
+        intraday_by_ts[t] = {
+            "pct": float(pct),
+            "ts": t
+        }
 
-        for bar in bars:
-            t = bar.get("t")
-            o = bar.get("o")
-            c = bar.get("c")
+    intraday = list(intraday_by_ts.values())
 
-            if t is None or o is None or c is None:
-                continue
+    intraday_cutoff = (now_utc() - dt.timedelta(hours=INTRADAY_LOOKBACK_HOURS)).isoformat(timespec="seconds").replace("+00:00", "Z")
+    intraday = [e for e in intraday if e.get("ts", "") >= intraday_cutoff]
 
-            date_str = t[:10]
+    intraday.sort(key=lambda x: x.get("ts", ""))
 
-            # compute pct
-            pct = 0.0 if o == 0 else (c - o) / o
+    return intraday
 
-            # ALWAYS overwrite today's value (or any day's)
-            closes_by_date[date_str] = {
-                "pct": float(pct),
-                "date": date_str
-            }
 
-        # Convert dict back to list
-        closes = list(closes_by_date.values())
+def write_universe_row(writer: BulkUpsertWriter, row, closes, intraday):
+    """Queue the row's update; False if its data did not change."""
+    update_payload = {
+        **{col: row.get(col) for col in UNIVERSE_IDENTITY_COLUMNS if col in row},
+        "closes_30d": encode_for_storage(closes, value_key="pct", date_key="date"),
+        "intraday": encode_for_storage(intraday, value_key="pct", date_key="ts"),
+        "last_updated_at": now_utc().isoformat()
+    }
 
-        # Only keep the configured lookback window
-        cutoff_date = (now_utc().date() - dt.timedelta(days=LOOKBACK_DAYS)).isoformat()
-        closes = [e for e in closes if e.get("date", "") >= cutoff_date]
+    return writer.add(update_payload)
 
-        # Sort
-        closes.sort(key=lambda x: x.get("date", ""))
 
-        intraday_bars = get_intraday_bars(symbol)
+def load_referenced_symbols():
+    """Set of symbols held by any strategy in strategy_metrics.portfolio_holdings."""
+    symbols = set()
+    for row in iter_rows(supabase, "strategy_metrics", "strategy_id, portfolio_holdings", key="strategy_id"):
+        holdings = row.get("portfolio_holdings") or []
+        if not isinstance(holdings, list):
+            continue
+        for h in holdings:
+            if isinstance(h, dict) and h.get("symbol"):
+                symbols.add(h["symbol"])
+    return symbols
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        ts = dt.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+
+def select_rows_by_demand(rows, referenced, stats=None):
+    """
+    Keep rows whose symbol is referenced by a strategy, plus unreferenced
+    rows that are due for their background refresh. Counts are accumulated
+    into `stats` when given.
+    """
+    background_cutoff = now_utc() - dt.timedelta(seconds=BACKGROUND_REFRESH_SECONDS)
+
+    hot, background = [], []
+    for row in rows:
+        if row.get("symbol") in referenced:
+            hot.append(row)
+            continue
+        last_updated = _parse_timestamp(row.get("last_updated_at"))
+        refreshed = _refreshed_at.get(row.get("symbol"))
+        if refreshed is not None and (last_updated is None or refreshed > last_updated):
+            last_updated = refreshed
+        if last_updated is None or last_updated < background_cutoff:
+            background.append(row)
 
-        intraday = row.get("intraday") or []
-        if not isinstance(intraday, list):
-            intraday = []
+    if stats is not None:
+        stats["referenced"] += len(hot)
+        stats["background"] += len(background)
+        stats["deferred"] += len(rows) - len(hot) - len(background)
+    return hot + background
 
-        intraday_by_ts = {e.get("ts"): e for e in intraday if isinstance(e, dict) and "ts" in e}
 
-        for bar in intraday_bars:
-            t = bar.get("t")
-            o = bar.get("o")
-            c = bar.get("c")
+def _fetch_row_update(row, full_resync: bool):
+    """Fetch and merge one row on its own (non-batched). Returns [(row, closes, intraday)]."""
+    symbol = row["symbol"]
 
-            if t is None or o is None or c is None:
-                continue
+    print(f"[INFO] Updating {symbol}...")
 
-            pct = 0.0 if o == 0 else (c - o) / o
+    since = None if full_resync else incremental_start_date(daily_watermark(row))
+    bars = get_bars_last_3_years(symbol, since)
+    if not bars:
+        print(f"[INFO] Skipping {symbol}, no bars in range")
+        return []
 
-            intraday_by_ts[t] = {
-                "pct": float(pct),
-                "ts": t
-            }
+    intraday_bars = get_intraday_bars(symbol)
+    store_bars(symbol, bars, intraday_bars, full_resync)
 
-        intraday = list(intraday_by_ts.values())
+    closes = merge_daily_closes(row, bars)
+    intraday = merge_intraday(row, intraday_bars)
 
-        intraday_cutoff = (now_utc() - dt.timedelta(hours=INTRADAY_LOOKBACK_HOURS)).isoformat(timespec="seconds").replace("+00:00", "Z")
-        intraday = [e for e in intraday if e.get("ts", "") >= intraday_cutoff]
+    return [(row, closes, intraday)]
 
-        intraday.sort(key=lambda x: x.get("ts", ""))
 
-        update_payload = {
-            "closes_30d": closes,
-            "intraday": intraday,
-            "last_updated_at": now_utc().isoformat()
-        }
+def _fetch_chunk_updates(chunk, full_resync: bool):
+    """Fetch and merge a chunk of rows with multi-symbol requests. Returns [(row, closes, intraday)]."""
+    symbols = [r["symbol"] for r in chunk]
+
+    print(f"[INFO] Fetching bars for batch of {len(symbols)} symbols ({symbols[0]}..{symbols[-1]})")
 
-        supabase.table("trading_universe").update(update_payload).eq("id", row["id"]).execute()
+    if full_resync:
+        since = None
+    else:
+        starts = [incremental_start_date(daily_watermark(r)) for r in chunk]
+        since = None if None in starts else min(starts)
 
-        print(f"[INFO] {symbol} updated, total days stored: {len(closes)}")
+    daily_by_symbol = get_bars_multi(symbols, "1D", *_daily_range_iso(since))
+    intraday_by_symbol = get_bars_multi(symbols, "1Min", *_intraday_range_iso())
 
+    updates = []
+    for row in chunk:
+        symbol = row["symbol"]
+
+        bars = daily_by_symbol.get(symbol) or []
+        if not bars:
+            print(f"[INFO] Skipping {symbol}, no bars in range")
+            continue
+
+        intraday_bars = intraday_by_symbol.get(symbol) or []
+        store_bars(symbol, bars, intraday_bars, full_resync)
+
+        closes = merge_daily_closes(row, bars)
+        intraday = merge_intraday(row, intraday_bars)
+        updates.append((row, closes, intraday))
+
+    return updates
+
+
+def _work_units(rows, full_resync: bool, batched: bool):
+    """Split rows into fetch units: single rows, or chunks of SYMBOLS_PER_REQUEST when batched."""
+    rows = [r for r in rows if r.get("symbol")]
+
+    if not batched:
+        return [[r] for r in rows]
+
+    # Rows with similar watermarks share a request window, so order by watermark
+    # before chunking. Rows with no history sort first and get the full window.
+    if not full_resync:
+        rows.sort(key=lambda r: daily_watermark(r) or dt.date.min)
+
+    return [rows[i:i + SYMBOLS_PER_REQUEST] for i in range(0, len(rows), SYMBOLS_PER_REQUEST)]
+
+
+def _iter_work_units(pages, full_resync: bool, batched: bool, referenced, stats):
+    """
+    Turn streamed trading_universe pages into fetch units one page at a time,
+    so only a page of rows (plus the units in flight) is held in memory.
+    """
+    for rows in pages:
+        stats["rows"] += len(rows)
+
+        # Accept both the legacy list layout and the compact encoding
+        for row in rows:
+            if PARTIAL_WRITES and row.get("id") is not None:
+                universe_fingerprints.seed(row["id"], row, "id")
+            row["closes_30d"] = decode_series(row.get("closes_30d"))
+            row["intraday"] = decode_series(row.get("intraday"))
+
+        if referenced is not None:
+            rows = select_rows_by_demand(rows, referenced, stats)
+
+        yield from _work_units(rows, full_resync, batched)
+
+
+def _fetch_unit(unit, full_resync: bool, batched: bool):
+    if batched:
+        return _fetch_chunk_updates(unit, full_resync)
+    return _fetch_row_update(unit[0], full_resync)
+
+
+def _write_update(writer: BulkUpsertWriter, update, changed: Set[str]):
+    row, closes, intraday = update
+    _refreshed_at[row["symbol"]] = now_utc()
+    if not write_universe_row(writer, row, closes, intraday):
+        print(f"[INFO] {row['symbol']} unchanged, total days stored: {len(closes)}")
+        return
+    if closes != row.get("closes_30d") or intraday != row.get("intraday"):
+        changed.add(row["symbol"])
+    print(f"[INFO] {row['symbol']} queued, total days stored: {len(closes)}")
+
+
+def _update_units_sequential(writer: BulkUpsertWriter, units, full_resync: bool, batched: bool, changed: Set[str]):
+    for unit in units:
+        for update in _fetch_unit(unit, full_resync, batched):
+            _write_update(writer, update, changed)
+
+
+def _update_units_pipelined(
+    writer: BulkUpsertWriter,
+    units,
+    full_resync: bool,
+    batched: bool,
+    concurrency: int,
+    changed: Set[str],
+):
+    """
+    Overlap Alpaca fetches, merges and Supabase writes.
+
+    Up to `concurrency` fetch units run at once and up to WRITE_CONCURRENCY
+    writes run at once. Submission blocks once `concurrency` fetches or
+    MAX_PENDING_WRITES writes are in flight, so a slow side applies
+    backpressure instead of buffering the whole universe in memory.
+    """
+    fetch_slots = threading.BoundedSemaphore(concurrency)
+    write_slots = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="universe-fetch") as fetch_pool, \
+            ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY, thread_name_prefix="universe-write") as write_pool:
+
+        def write_and_release(update):
+            try:
+                _write_update(writer, update, changed)
+            except Exception as e:
+                print(f"[ERROR] Write failed for {update[0].get('symbol')}: {e}")
+            finally:
+                write_slots.release()
+
+        def fetch_and_hand_off(unit):
+            try:
+                updates = _fetch_unit(unit, full_resync, batched)
+            except Exception as e:
+                print(f"[ERROR] Fetch failed for {[r.get('symbol') for r in unit]}: {e}")
+                updates = []
+            finally:
+                fetch_slots.release()
+
+            for update in updates:
+                write_slots.acquire()
+                write_pool.submit(write_and_release, update)
+
+        futures = []
+        for unit in units:
+            fetch_slots.acquire()
+            futures.append(fetch_pool.submit(fetch_and_hand_off, unit))
+
+        for f in futures:
+            f.result()
+
+
+def update_trading_universe_closes_3y(
+    batched: bool = BATCHED_FETCH,
+    full_resync: bool = True,
+    pipelined: bool = PIPELINED,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    demand_driven: bool = DEMAND_DRIVEN,
+):
+    """
+    Refresh closes_30d and intraday for every trading_universe row.
+
+    With full_resync=False only bars after each row's stored watermark
+    (minus INCREMENTAL_OVERLAP_DAYS) are fetched and merged, and with
+    demand_driven=True unreferenced symbols are only refreshed on their
+    background cadence. With pipelined=True fetch units and writes run
+    concurrently, bounded by `concurrency`.
+
+    Returns the set of symbols whose closes_30d or intraday changed.
+    """
+    mode = "full re-sync" if full_resync else "incremental"
+    print(f"[INFO] Fetching trading_universe rows ({mode})...")
+
+    referenced = load_referenced_symbols() if demand_driven and not full_resync else None
+    stats = {"rows": 0, "referenced": 0, "background": 0, "deferred": 0}
+
+    pages = iter_pages(supabase, "trading_universe", UNIVERSE_COLUMNS, key="id", page_size=READ_PAGE_SIZE)
+    units = _iter_work_units(pages, full_resync, batched, referenced, stats)
+    changed: Set[str] = set()
+
+    with BulkUpsertWriter(
+        supabase,
+        "trading_universe",
+        key="id",
+        batch_size=WRITE_BATCH_SIZE,
+        fingerprints=universe_fingerprints if PARTIAL_WRITES else None,
+        required_columns=UNIVERSE_IDENTITY_COLUMNS,
+    ) as writer:
+        if pipelined and concurrency > 1:
+            _update_units_pipelined(writer, units, full_resync, batched, concurrency, changed)
+        else:
+            _update_units_sequential(writer, units, full_resync, batched, changed)
+
+    writer.report()
+
+    print(f"[INFO] Scanned {stats['rows']} instruments")
+    if referenced is not None:
+        print(
+            f"[INFO] Demand-driven refresh: {stats['referenced']} referenced, "
+            f"{stats['background']} background due, {stats['deferred']} deferred"
+        )
+
+    print(f"[INFO] {len(changed)} instruments changed")
     print(f"[INFO] Done updating closes_30d for last {LOOKBACK_DAYS} days.")
 
+    return changed
+
 
 # ===================== SCHEDULER =======================
 
-if __name__ == "__main__":
-    print("[ENGINE] Universe updater started — running every 10 minutes.")
+_last_full_resync = None
 
-    while True:
-        try:
-            print(f"\n[ENGINE] Run at {now_utc().isoformat()}")
-            update_trading_universe_closes_3y()
-        except Exception as e:
-            print(f"[ERROR] Universe update failed: {e}")
 
-        # Sleep 10 minutes
-        time.sleep(600)
+def run_scheduled_cycle(phase: str) -> Set[str]:
+    """
+    One scheduler tick: incremental intraday refresh, full re-sync on
+    settlement. Returns the symbols that changed.
+    """
+    global _last_full_resync
+
+    run_started = now_utc()
+    full_resync = _last_full_resync is None or (
+        phase == PHASE_SETTLEMENT
+        and (run_started - _last_full_resync).total_seconds() >= FULL_RESYNC_INTERVAL_SECONDS
+    )
+
+    changed = update_trading_universe_closes_3y(full_resync=full_resync)
+
+    if full_resync:
+        _last_full_resync = run_started
+
+    return changed
+
+
+if __name__ == "__main__":
+    print(
+        "[ENGINE] Universe updater started — every "
+        f"{INTRADAY_INTERVAL_SECONDS // 60} minutes during the NYSE session, plus a post-close settlement pass."
+    )
+    run_market_scheduler(run_scheduled_cycle, "Universe update", INTRADAY_INTERVAL_SECONDS)